@@ -0,0 +1,65 @@
+"""
+Event loop responsiveness and throughput of AsyncHand.
+
+num_requests concurrent requests of LINES are awaited on one event loop, while a heartbeat task measures
+the longest stall of the loop.  Calling Hand._sample directly from the coroutines (blocking) is compared
+against AsyncHand with different max_concurrency, all sampling with the same Hand.  The last column checks
+that a request with a short timeout is given up on with asyncio.TimeoutError.
+
+    python -m benchmarks.async_hand [num_requests]
+"""
+import asyncio
+import sys
+import time
+
+from benchmarks.style_cache import LINES
+from handwriting_synthesis.hand import AsyncHand, Hand
+
+
+async def heartbeat(ticks, interval=.005):
+    while True:
+        await asyncio.sleep(interval)
+        ticks.append(time.time())
+
+
+async def serve(sample, num_requests, interval=.005):
+    start = time.time()
+    ticks = [start]
+    beat = asyncio.ensure_future(heartbeat(ticks, interval))
+    await asyncio.gather(*[sample(LINES) for _ in range(num_requests)])
+    ticks.append(time.time())
+    beat.cancel()
+    return ticks[-1] - start, max(b - a for a, b in zip(ticks, ticks[1:])) - interval
+
+
+async def times_out(hand):
+    try:
+        await hand.sample(LINES, timeout=.01)
+    except asyncio.TimeoutError:
+        return True
+    return False
+
+
+if __name__ == '__main__':
+    num_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    print('{:<16}{:>10}{:>12}{:>16}{:>12}'.format('front end', 'secs', 'lines/sec', 'max_stall_ms', 'timeout'))
+
+    hand = Hand()
+
+    async def blocking(lines):
+        return hand._sample(lines)
+
+    asyncio.run(serve(blocking, 1))
+    elapsed, stall = asyncio.run(serve(blocking, num_requests))
+    print('{:<16}{:>10.2f}{:>12.2f}{:>16.1f}{:>12}'.format(
+        'blocking', elapsed, num_requests * len(LINES) / elapsed, stall * 1000, '-'))
+
+    for max_concurrency in [1, 2, 4]:
+        async_hand = AsyncHand(hand, max_concurrency=max_concurrency)
+        asyncio.run(serve(async_hand.sample, 1))
+        elapsed, stall = asyncio.run(serve(async_hand.sample, num_requests))
+        timed_out = asyncio.run(times_out(async_hand))
+        async_hand.close()
+        print('{:<16}{:>10.2f}{:>12.2f}{:>16.1f}{:>12}'.format(
+            'async x{}'.format(max_concurrency), elapsed, num_requests * len(LINES) / elapsed, stall * 1000,
+            str(timed_out)))
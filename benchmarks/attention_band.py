@@ -0,0 +1,88 @@
+"""
+Accuracy and speed of the banded attention window (Hand(attention_band=...)) against the window over
+every character.
+
+For each band width, the states after priming with each style and a line are compared with those of the
+full window (max abs difference over styles and lines).  Then the same lines are sampled with full
+priming per line, where the attention values are the priming text plus the line, and the sampling time
+and sample statistics are reported.  Finally the per-step latency of the free running loop body is
+measured for growing numbers of characters.
+
+    python -m benchmarks.attention_band [num_repeats]
+"""
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+import tensorflow.compat.v1 as tfcompat
+
+from benchmarks.fused_lstm import free_run_steps
+from benchmarks.style_cache import LINES, STYLES, full_primed_state, sample_stats
+from handwriting_synthesis import drawing
+from handwriting_synthesis.hand import Hand
+from handwriting_synthesis.rnn import LSTMAttentionCell
+
+BANDS = [None, 32, 16, 8]
+FIELDS = ['h3', 'c3', 'w', 'kappa']
+
+
+def step_latency(band, batch_size, char_len, num_steps=300):
+    with tf.Graph().as_default():
+        chars = np.random.randint(1, len(drawing.alphabet), size=[batch_size, char_len])
+        cell = LSTMAttentionCell(
+            lstm_size=400,
+            num_attn_mixture_components=10,
+            attention_values=tf.one_hot(chars, len(drawing.alphabet)),
+            attention_values_lengths=tf.fill([batch_size], char_len),
+            num_output_mixture_components=20,
+            bias=tf.fill([batch_size], .75),
+            attention_band=band,
+        )
+        with tfcompat.variable_scope('rnn'):
+            loop = free_run_steps(cell, cell.zero_state(batch_size, tf.float32), num_steps)
+
+        with tfcompat.Session() as session:
+            session.run(tfcompat.global_variables_initializer())
+            session.run(loop)
+            start = time.time()
+            session.run(loop)
+            return (time.time() - start) / num_steps * 1000
+
+if __name__ == '__main__':
+    num_repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    hands = {band: Hand(attention_band=band, state_sampling=True) for band in BANDS}
+
+    full_states = {
+        (style, line): full_primed_state(hands[None], style, line) for style in STYLES for line in LINES}
+    lines = LINES * len(STYLES)
+    styles = np.repeat(STYLES, len(LINES))
+    biases = [.75] * len(lines)
+
+    print('{:<6}{}{:>10}{:>14}{:>16}{:>12}'.format(
+        'band', ''.join('{:>10}'.format(f) for f in FIELDS), 'secs', 'steps/char', 'strokes/char', 'step size'))
+    for band, hand in hands.items():
+        diffs = {field: 0.0 for field in FIELDS}
+        for (style, line), full_state in full_states.items():
+            state = full_primed_state(hand, style, line)
+            for field in FIELDS:
+                diffs[field] = max(diffs[field], np.abs(state[field] - full_state[field]).max())
+
+        stats, elapsed = [], 0
+        hand._sample(lines[:1], biases=biases[:1], styles=styles[:1])
+        for _ in range(num_repeats):
+            start = time.time()
+            samples = hand._sample(lines, biases=biases, styles=styles)
+            elapsed += time.time() - start
+            stats.append(sample_stats(samples, lines))
+        stats = np.mean(stats, axis=0)
+        print('{:<6}{}{:>10.2f}{:>14.2f}{:>16.3f}{:>12.3f}'.format(
+            str(band), ''.join('{:>10.4f}'.format(diffs[f]) for f in FIELDS), elapsed / num_repeats, *stats))
+
+    char_lens = [50, 200, 800]
+    print()
+    print('per-step latency (ms) at batch size 32')
+    print('{:<6}{}'.format('band', ''.join('{:>10}'.format(char_len) for char_len in char_lens)))
+    for band in BANDS:
+        print('{:<6}{}'.format(str(band), ''.join(
+            '{:>10.2f}'.format(step_latency(band, 32, char_len)) for char_len in char_lens)))
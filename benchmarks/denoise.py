@@ -0,0 +1,77 @@
+"""
+Checks that drawing.denoise, which smooths every stroke with one convolution, matches the stroke by stroke
+savgol_filter it replaced, and times both, on the handwriting of the style files and on random strokes of
+every length from 1 point up.  Fails unless float32 strokes (like those of the style files) come out bit
+for bit the same, and float64 ones to within TOLERANCE (the sums are taken in a different order).
+
+    python -m benchmarks.denoise [num_lines]
+"""
+import sys
+import time
+
+import numpy as np
+from scipy.signal import savgol_filter
+
+from handwriting_synthesis import drawing
+from handwriting_synthesis.config import style_path
+
+STYLES = range(13)
+TOLERANCE = 1e-10
+
+
+def reference_denoise(coords):
+    coords = np.split(coords, np.where(coords[:, 2] == 1)[0] + 1, axis=0)
+    new_coords = []
+    for stroke in coords:
+        if len(stroke) != 0:
+            x_new = savgol_filter(stroke[:, 0], 7, 3, mode='nearest')
+            y_new = savgol_filter(stroke[:, 1], 7, 3, mode='nearest')
+            xy_coords = np.hstack([x_new.reshape(-1, 1), y_new.reshape(-1, 1)])
+            stroke = np.concatenate([xy_coords, stroke[:, 2].reshape(-1, 1)], axis=1)
+            new_coords.append(stroke)
+
+    coords = np.vstack(new_coords)
+    return coords
+
+
+def random_coords(num_points, pen_up, dtype, rng):
+    coords = np.cumsum(rng.normal(size=[num_points, 3]), axis=0).astype(dtype)
+    coords[:, 2] = rng.random(num_points) < pen_up
+    return coords
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+
+if __name__ == '__main__':
+    num_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = np.random.default_rng(0)
+    styles = [np.load('{}/style-{}-strokes.npy'.format(style_path, style)) for style in STYLES]
+    cases = {'style files': [drawing.offsets_to_coords(styles[i % len(styles)]) for i in range(num_lines)]}
+    for dtype in [np.float32, np.float64]:
+        cases['random ' + np.dtype(dtype).name] = [
+            random_coords(rng.integers(1, 1000), rng.random(), dtype, rng) for _ in range(num_lines)]
+
+    print('{:<20}{:>12}{:>12}{:>10}{:>14}{:>12}'.format(
+        'strokes', 'loop secs', 'conv secs', 'speedup', 'max diff', 'identical'))
+    for name, lines in cases.items():
+        reference, loop_secs = timed(lambda: [reference_denoise(c) for c in lines])
+        denoised, conv_secs = timed(lambda: [drawing.denoise(c) for c in lines])
+        difference = max(np.abs(a - b).max() for a, b in zip(reference, denoised))
+        identical = all(a.dtype == b.dtype and np.array_equal(a, b) for a, b in zip(reference, denoised))
+        print('{:<20}{:>12.4f}{:>12.4f}{:>10.1f}{:>14.2e}{:>12}'.format(
+            name, loop_secs, conv_secs, loop_secs / conv_secs, difference, str(identical)))
+        assert difference <= TOLERANCE
+        assert identical or lines[0].dtype != np.float32
+
+    page = drawing.RaggedStrokes.from_lines(cases['style files'])
+    reference, loop_secs = timed(lambda: [reference_denoise(c) for c in cases['style files']])
+    denoised, conv_secs = timed(lambda: page.denoise().to_lines())
+    identical = all(np.array_equal(a, b) for a, b in zip(reference, denoised))
+    print('{:<20}{:>12.4f}{:>12.4f}{:>10.1f}{:>14.2e}{:>12}'.format(
+        'RaggedStrokes', loop_secs, conv_secs, loop_secs / conv_secs,
+        max(np.abs(a - b).max() for a, b in zip(reference, denoised)), str(identical)))
+    assert identical
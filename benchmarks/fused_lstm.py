@@ -0,0 +1,78 @@
+"""
+Per-step latency of LSTMAttentionCell with LSTMCell ops against fused LSTMBlockCell kernels.  Each timing
+runs num_steps of the free running loop body (cell step plus output function, the sample fed back as the
+next input) inside a single while_loop.  Both cells share their variables, and the max abs difference
+of one step from the same state is reported as a parity check.
+
+    python -m benchmarks.fused_lstm [num_steps]
+"""
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+import tensorflow.compat.v1 as tfcompat
+
+from handwriting_synthesis import drawing
+from handwriting_synthesis.rnn import LSTMAttentionCell
+
+tfcompat.disable_v2_behavior()
+
+
+def free_run_steps(cell, initial_state, num_steps):
+    def body(i, inputs, state):
+        _, state = cell(inputs, state)
+        return i + 1, cell.output_function(state), state
+
+    initial_input = tf.tile([[0., 0., 1.]], [cell.batch_size, 1])
+    return tf.while_loop(lambda i, *_: i < num_steps, body, [0, initial_input, initial_state])[2].h3
+
+
+def benchmark(batch_size, char_len, num_steps):
+    with tf.Graph().as_default():
+        chars = np.random.randint(1, len(drawing.alphabet), size=[batch_size, char_len])
+        cells = {
+            fused: LSTMAttentionCell(
+                lstm_size=400,
+                num_attn_mixture_components=10,
+                attention_values=tf.one_hot(chars, len(drawing.alphabet)),
+                attention_values_lengths=tf.fill([batch_size], char_len),
+                num_output_mixture_components=20,
+                bias=tf.fill([batch_size], .75),
+                fused_lstm=fused,
+            )
+            for fused in [False, True]
+        }
+        state = cells[False].zero_state(batch_size, tf.float32)
+        state = state._replace(**{
+            field: tf.constant(np.random.normal(size=[batch_size, 400]), dtype=tf.float32)
+            for field in ['h1', 'c1', 'h2', 'c2', 'h3', 'c3']
+        })
+        inputs = tf.constant(np.random.normal(size=[batch_size, 3]), dtype=tf.float32)
+
+        with tfcompat.variable_scope('rnn'):
+            steps = {fused: cells[fused](inputs, state)[1] for fused in [False, True]}
+            loops = {fused: free_run_steps(cells[fused], state, num_steps) for fused in [False, True]}
+
+        with tfcompat.Session() as session:
+            session.run(tfcompat.global_variables_initializer())
+            unfused_step, fused_step = session.run([steps[False], steps[True]])
+            diff = max(np.abs(a - b).max() for a, b in zip(unfused_step, fused_step))
+
+            latencies = {}
+            for fused, loop in loops.items():
+                session.run(loop)
+                start = time.time()
+                session.run(loop)
+                latencies[fused] = (time.time() - start) / num_steps * 1000
+
+        print('{:>6}{:>10}{:>16.3f}{:>16.3f}{:>14.1e}'.format(
+            batch_size, char_len, latencies[False], latencies[True], diff))
+
+
+if __name__ == '__main__':
+    num_steps = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print('{:>6}{:>10}{:>16}{:>16}{:>14}'.format('batch', 'char_len', 'LSTMCell ms', 'fused ms', 'max diff'))
+    for batch_size in [1, 16, 64]:
+        for char_len in [20, 300]:
+            benchmark(batch_size, char_len, num_steps)
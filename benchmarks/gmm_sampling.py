@@ -0,0 +1,83 @@
+"""
+Compares the output head of LSTMAttentionCell (one GMM draw per step) against the previous sampler,
+which sampled every component with MultivariateNormalFullCovariance and then picked one.  Reports
+output-function steps/sec per batch size, plus the moments of the samples as a sanity check.
+
+    python -m benchmarks.gmm_sampling [num_steps]
+"""
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+import tensorflow.compat.v1 as tfcompat
+import tensorflow.compat.v1.distributions as tfd
+import tensorflow_probability as tfp
+
+from handwriting_synthesis import drawing
+from handwriting_synthesis.rnn import LSTMAttentionCell
+from handwriting_synthesis.tf.utils import dense_layer
+
+tfcompat.disable_v2_behavior()
+
+
+def mvn_output_function(cell, state):
+    """output_function as implemented before closed-form sampling"""
+    params = dense_layer(state.h3, cell.output_units, scope='gmm', reuse=tfcompat.AUTO_REUSE)
+    pis, mus, sigmas, rhos, es = cell._parse_parameters(params)
+    mu1, mu2 = tf.split(mus, 2, axis=1)
+    mus = tf.stack([mu1, mu2], axis=2)
+    sigma1, sigma2 = tf.split(sigmas, 2, axis=1)
+
+    covar_matrix = [tf.square(sigma1), rhos * sigma1 * sigma2,
+                    rhos * sigma1 * sigma2, tf.square(sigma2)]
+    covar_matrix = tf.stack(covar_matrix, axis=2)
+    covar_matrix = tf.reshape(covar_matrix, (cell.batch_size, cell.num_output_mixture_components, 2, 2))
+
+    mvn = tfp.distributions.MultivariateNormalFullCovariance(loc=mus, covariance_matrix=covar_matrix)
+    b = tfd.Bernoulli(probs=es)
+    c = tfd.Categorical(probs=pis)
+
+    sampled_e = b.sample()
+    sampled_coords = mvn.sample()
+    sampled_idx = c.sample()
+
+    idx = tf.stack([tf.range(cell.batch_size), sampled_idx], axis=1)
+    coords = tf.gather_nd(sampled_coords, idx)
+    return tf.concat([coords, tf.cast(sampled_e, tf.float32)], axis=1)
+
+
+def benchmark(batch_size, num_steps):
+    with tf.Graph().as_default():
+        cell = LSTMAttentionCell(
+            lstm_size=400,
+            num_attn_mixture_components=10,
+            attention_values=tf.zeros([batch_size, 10, len(drawing.alphabet)]),
+            attention_values_lengths=tf.fill([batch_size], 10),
+            num_output_mixture_components=20,
+            bias=tf.fill([batch_size], .75),
+        )
+        state = cell.zero_state(batch_size, tf.float32)
+        state = state._replace(h3=tf.constant(np.random.normal(size=[batch_size, 400]), dtype=tf.float32))
+        outputs = {
+            'mvn': mvn_output_function(cell, state),
+            'closed_form': cell.output_function(state),
+        }
+
+        with tfcompat.Session() as session:
+            session.run(tfcompat.global_variables_initializer())
+            for name, output in outputs.items():
+                session.run(output)
+                start = time.time()
+                samples = np.concatenate([session.run(output) for _ in range(num_steps)], axis=0)
+                elapsed = time.time() - start
+                print('{:>6}{:>14}{:>14.0f}  mean {}  std {}'.format(
+                    batch_size, name, num_steps / elapsed,
+                    np.round(samples.mean(axis=0), 3), np.round(samples.std(axis=0), 3)))
+
+
+if __name__ == '__main__':
+    num_steps = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print('{:>6}{:>14}{:>14}'.format('batch', 'sampler', 'steps/sec'))
+    for batch_size in [1, 16, 64]:
+        benchmark(batch_size, num_steps)
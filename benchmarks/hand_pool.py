@@ -0,0 +1,44 @@
+"""
+Scaling of HandPool throughput with the number of worker processes.  One large job of num_lines lines
+is sampled by a single Hand in this process, then by pools of 1 to max_workers workers with and without
+CPU affinity.  Start up (restoring the model in every worker) is reported separately from sampling.
+
+    python -m benchmarks.hand_pool [max_workers] [num_lines]
+"""
+import os
+import sys
+import time
+
+from benchmarks.style_cache import LINES
+from handwriting_synthesis.hand import Hand, HandPool
+
+
+def throughput(sample, lines):
+    sample(lines[:4])
+    start = time.time()
+    samples = sample(lines)
+    elapsed = time.time() - start
+    assert len(samples) == len(lines)
+    return len(lines) / elapsed
+
+
+if __name__ == '__main__':
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    num_lines = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    lines = (LINES * num_lines)[:num_lines]
+    biases = [.75] * num_lines
+
+    print('{:<10}{:>10}{:>10}{:>12}{:>12}'.format('workers', 'affinity', 'start', 'lines/sec', 'speedup'))
+    hand = Hand()
+    baseline = throughput(lambda lines: hand._sample(lines, biases=biases[:len(lines)]), lines)
+    print('{:<10}{:>10}{:>10}{:>12.2f}{:>12.2f}'.format('Hand', '-', '-', baseline, 1.0))
+
+    for num_workers in range(1, max_workers + 1):
+        for cpu_affinity in [False, True]:
+            start = time.time()
+            pool = HandPool(num_workers=num_workers, cpu_affinity=cpu_affinity)
+            started = time.time() - start
+            rate = throughput(lambda lines: pool.sample(lines, biases=biases[:len(lines)]), lines)
+            pool.close()
+            print('{:<10}{:>10}{:>10.2f}{:>12.2f}{:>12.2f}'.format(
+                num_workers, str(cpu_affinity), started, rate, rate / baseline))
@@ -0,0 +1,95 @@
+"""
+Checks that drawing.interpolate, which fits the cubic splines of every stroke at once, matches the stroke
+by stroke interp1d it replaced to within TOLERANCE, and times both, on the handwriting of the style files
+and on random strokes of every length from 1 point up, at a few upsampling factors.
+
+    python -m benchmarks.interpolate [num_lines]
+"""
+import sys
+import time
+
+import numpy as np
+from scipy.interpolate import interp1d
+
+from handwriting_synthesis import drawing
+from handwriting_synthesis.config import style_path
+
+STYLES = range(13)
+TOLERANCE = 1e-8
+
+
+def reference_interpolate(coords, factor=2):
+    coords = np.split(coords, np.where(coords[:, 2] == 1)[0] + 1, axis=0)
+    new_coords = []
+    for stroke in coords:
+
+        if len(stroke) == 0:
+            continue
+
+        xy_coords = stroke[:, :2]
+
+        if len(stroke) > 3:
+            f_x = interp1d(np.arange(len(stroke)), stroke[:, 0], kind='cubic')
+            f_y = interp1d(np.arange(len(stroke)), stroke[:, 1], kind='cubic')
+
+            xx = np.linspace(0, len(stroke) - 1, factor * (len(stroke)))
+            yy = np.linspace(0, len(stroke) - 1, factor * (len(stroke)))
+
+            x_new = f_x(xx)
+            y_new = f_y(yy)
+
+            xy_coords = np.hstack([x_new.reshape(-1, 1), y_new.reshape(-1, 1)])
+
+        stroke_eos = np.zeros([len(xy_coords), 1])
+        stroke_eos[-1] = 1.0
+        stroke = np.concatenate([xy_coords, stroke_eos], axis=1)
+        new_coords.append(stroke)
+
+    coords = np.vstack(new_coords)
+    return coords
+
+
+def random_coords(num_points, pen_up, rng):
+    coords = np.cumsum(rng.normal(size=[num_points, 3]), axis=0)
+    coords[:, 2] = rng.random(num_points) < pen_up
+    return coords
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+
+def max_difference(reference, interpolated):
+    assert all(a.shape == b.shape for a, b in zip(reference, interpolated))
+    return max(np.abs(a - b).max() for a, b in zip(reference, interpolated))
+
+
+if __name__ == '__main__':
+    num_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = np.random.default_rng(0)
+    styles = [np.load('{}/style-{}-strokes.npy'.format(style_path, style)) for style in STYLES]
+    cases = {
+        'style files': [drawing.offsets_to_coords(styles[i % len(styles)]) for i in range(num_lines)],
+        'random': [random_coords(rng.integers(1, 1000), rng.random(), rng) for _ in range(num_lines)],
+    }
+
+    print('{:<20}{:>8}{:>12}{:>12}{:>10}{:>14}'.format(
+        'strokes', 'factor', 'loop secs', 'batch secs', 'speedup', 'max diff'))
+    for name, lines in cases.items():
+        for factor in [2, 4]:
+            reference, loop_secs = timed(lambda: [reference_interpolate(c, factor) for c in lines])
+            interpolated, batch_secs = timed(lambda: [drawing.interpolate(c, factor) for c in lines])
+            difference = max_difference(reference, interpolated)
+            print('{:<20}{:>8}{:>12.4f}{:>12.4f}{:>10.1f}{:>14.2e}'.format(
+                name, factor, loop_secs, batch_secs, loop_secs / batch_secs, difference))
+            assert difference < TOLERANCE
+
+    page = drawing.RaggedStrokes.from_lines(cases['style files'])
+    reference, loop_secs = timed(lambda: [reference_interpolate(c) for c in cases['style files']])
+    interpolated, batch_secs = timed(lambda: page.interpolate().to_lines())
+    difference = max_difference(reference, interpolated)
+    print('{:<20}{:>8}{:>12.4f}{:>12.4f}{:>10.1f}{:>14.2e}'.format(
+        'RaggedStrokes', 2, loop_secs, batch_secs, loop_secs / batch_secs, difference))
+    assert difference < TOLERANCE
@@ -0,0 +1,65 @@
+"""
+Load generator comparing concurrent callers running Hand._sample directly against the same callers
+going through a MicroBatcher.  Each client thread sends requests of 1-3 short lines back to back for
+a fixed duration.  Reports throughput and latency percentiles.
+
+    python -m benchmarks.micro_batching [num_clients] [duration_secs]
+"""
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+
+from handwriting_synthesis.hand import Hand, MicroBatcher
+
+LINES = [
+    "Somebody once told me",
+    "the world is gonna roll me",
+    "Walking fast",
+    "Faces pass",
+    "Never gonna give you up",
+    "Seconds drift into the night",
+]
+
+
+def run_clients(sample, num_clients, duration):
+    latencies = []
+    num_lines = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        while time.time() < stop_at:
+            lines = rng.sample(LINES, rng.randint(1, 3))
+            start = time.time()
+            sample(lines, biases=[.75] * len(lines))
+            with lock:
+                latencies.append(time.time() - start)
+                num_lines[0] += len(lines)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(num_clients)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    return num_lines[0] / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+if __name__ == '__main__':
+    num_clients = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+
+    hand = Hand()
+    hand._sample(LINES[:1])
+    batcher = MicroBatcher(hand, max_batch_size=64, max_wait=0.02)
+
+    print('{:<10}{:>14}{:>10}{:>10}'.format('mode', 'lines/sec', 'p50 (s)', 'p99 (s)'))
+    for name, sample in [('direct', hand._sample), ('batched', batcher.sample)]:
+        throughput, p50, p99 = run_clients(sample, num_clients, duration)
+        print('{:<10}{:>14.2f}{:>10.2f}{:>10.2f}'.format(name, throughput, p50, p99))
+    batcher.close()
@@ -0,0 +1,147 @@
+"""
+Parity check and benchmark of Hand's numpy backend against the tensorflow one.
+
+Parity: one step of NumpyRNN.cell and of LSTMAttentionCell, from the same random state and inputs and
+with the same random weights, must give the same state and output distribution to within STEP_TOLERANCE,
+so drift is caught without a trained checkpoint.  The states after priming with each style are
+deterministic, so they are compared field by field between the two backends and must agree to within
+PRIMED_TOLERANCE (float32 errors add up over the priming strokes; random weights give about 4e-6).
+Sampling is random, so the statistics of samples of the same lines are compared instead.
+
+Benchmark: worker start time and max RSS (each in a fresh interpreter, see benchmarks.startup) and
+sampling throughput in lines/sec.
+
+The numpy backend's speed is that of the BLAS matmuls in its LSTMs.  If OpenBLAS does not recognise the
+CPU it falls back to a generic kernel, so compare with OPENBLAS_CORETYPE set (e.g. to SkylakeX).
+
+    python -m benchmarks.numpy_backend [num_repeats]
+"""
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+import tensorflow.compat.v1 as tfcompat
+
+from benchmarks.startup import run_worker
+from benchmarks.style_cache import LINES, STYLES, sample_stats
+from handwriting_synthesis import drawing
+from handwriting_synthesis.hand import Hand, NumpyRNN
+from handwriting_synthesis.hand.NumpyRNN import NumpyCellState
+from handwriting_synthesis.rnn.LSTMAttentionCell import LSTMAttentionCell, LSTMAttentionCellState
+from handwriting_synthesis.tf.utils import dense_layer
+
+BACKENDS = ['tensorflow', 'numpy']
+FIELDS = ['h1', 'h2', 'h3', 'c3', 'kappa', 'w']
+STEP_FIELDS = ['h1', 'c1', 'h2', 'c2', 'h3', 'c3', 'alpha', 'beta', 'kappa', 'w', 'phi']
+GMM_PARAMETERS = ['pis', 'mus', 'sigmas', 'rhos', 'es']
+STEP_TOLERANCE = 1e-5
+PRIMED_TOLERANCE = 1e-4
+
+
+def one_step_differences(batch_size=16, char_len=40, attention_band=None, seed=0):
+    """
+    Max abs difference of each state field and gmm parameter between one step of LSTMAttentionCell and
+    of NumpyRNN.cell, from the same random state, inputs and characters, and with the tensorflow cell's
+    variables set to random values which are then handed to NumpyRNN as its checkpoint.
+    """
+    rng = np.random.default_rng(seed)
+    lstm_size, num_attn_mixture_components, num_output_mixture_components = 400, 10, 20
+    window_size = len(drawing.alphabet)
+    c_len = rng.integers(1, char_len + 1, batch_size)
+    c = rng.integers(1, window_size, [batch_size, char_len]) * (np.arange(char_len) < c_len[:, np.newaxis])
+    attention_values = np.eye(window_size, dtype=np.float32)[c]
+    attention_values *= (np.arange(char_len) < c_len[:, np.newaxis])[:, :, np.newaxis]
+    inputs = rng.normal(size=[batch_size, 3]).astype(np.float32)
+    bias = rng.random(batch_size).astype(np.float32)
+    state = NumpyCellState(
+        *rng.normal(size=[6, batch_size, lstm_size]).astype(np.float32),
+        *rng.random([3, batch_size, num_attn_mixture_components]).astype(np.float32),
+        rng.random([batch_size, window_size]).astype(np.float32),
+        rng.random([batch_size, char_len]).astype(np.float32),
+    )
+    state = state._replace(kappa=state.kappa * char_len)
+
+    graph = tf.Graph()
+    with graph.as_default(), tfcompat.variable_scope('rnn'):
+        cell = LSTMAttentionCell(
+            lstm_size=lstm_size,
+            num_attn_mixture_components=num_attn_mixture_components,
+            attention_values=tf.constant(attention_values),
+            attention_values_lengths=tf.constant(c_len, dtype=tf.int32),
+            num_output_mixture_components=num_output_mixture_components,
+            bias=tf.constant(bias),
+            attention_band=attention_band,
+        )
+        _, tf_state = cell(tf.constant(inputs), LSTMAttentionCellState(*[tf.constant(v) for v in state]))
+        tf_params = cell._parse_parameters(
+            dense_layer(tf_state.h3, cell.output_units, scope='gmm', reuse=tfcompat.AUTO_REUSE))
+        variables = tfcompat.global_variables()
+
+    with tfcompat.Session(graph=graph) as session:
+        weights = {}
+        for variable in variables:
+            weights[variable.op.name] = rng.normal(
+                scale=.1, size=variable.shape.as_list()).astype(np.float32)
+            session.run(variable.assign(weights[variable.op.name]))
+        tf_state, tf_params = session.run([tf_state, tf_params])
+
+    nn = NumpyRNN(weights, attention_band=attention_band)
+    np_state = nn.cell(inputs, state, attention_values)
+    np_params = nn.parse_parameters(np_state, bias)
+    differences = {f: np.abs(getattr(tf_state, f) - getattr(np_state, f)).max() for f in STEP_FIELDS}
+    differences.update(
+        (name, np.abs(tf_value.reshape(np_value.shape) - np_value).max())
+        for name, tf_value, np_value in zip(GMM_PARAMETERS, tf_params, np_params))
+    return differences
+
+
+if __name__ == '__main__':
+    num_repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    # workers are started before this process loads any model, since a child's max RSS starts out
+    # at its parent's
+    print('{:<12}{:>10}{:>10}{:>14}{:>14}'.format('backend', 'import', 'load', 'first_sample', 'max_rss_mb'))
+    for backend in BACKENDS:
+        runs = [run_worker('backend={!r}'.format(backend)) for _ in range(num_repeats)]
+        mean = {key: sum(run[key] for run in runs) / num_repeats for key in runs[0]}
+        print('{:<12}{:>10.2f}{:>10.2f}{:>14.2f}{:>14.0f}'.format(
+            backend, mean['import'], mean['load'], mean['first_sample'], mean['max_rss_mb']))
+
+    print()
+    print('max abs difference after one step from the same state, random weights')
+    names = STEP_FIELDS + GMM_PARAMETERS
+    print('{:>6}  {}'.format('band', '  '.join('{:>9}'.format(name) for name in names)))
+    for attention_band in [None, 8]:
+        differences = one_step_differences(attention_band=attention_band)
+        print('{:>6}  {}'.format(str(attention_band), '  '.join(
+            '{:>9.2e}'.format(differences[name]) for name in names)))
+        assert max(differences.values()) <= STEP_TOLERANCE
+
+    hands = {backend: Hand(backend=backend, state_sampling=True) for backend in BACKENDS}
+    print()
+    print('max abs difference between primed states')
+    print('{:>6}  {}'.format('style', '  '.join('{:>9}'.format(f) for f in FIELDS)))
+    for style in STYLES:
+        tf_state, np_state = [hands[backend]._style_state(style) for backend in BACKENDS]
+        differences = [np.abs(tf_state[f] - np_state[f]).max() for f in FIELDS]
+        print('{:>6}  {}'.format(style, '  '.join('{:>9.2e}'.format(d) for d in differences)))
+        assert max(differences) <= PRIMED_TOLERANCE
+
+    lines = LINES * len(STYLES)
+    biases = [.75] * len(lines)
+    print()
+    print('{:<12}{:<8}{:>12}{:>16}{:>18}{:>12}'.format(
+        'backend', 'styled', 'lines/sec', 'steps/char', 'strokes/char', 'step size'))
+    for styles in [None, np.repeat(STYLES, len(LINES))]:
+        for backend in BACKENDS:
+            stats, elapsed = [], 0
+            for _ in range(num_repeats):
+                start = time.time()
+                samples = hands[backend]._sample(lines, biases=biases, styles=styles)
+                elapsed += time.time() - start
+                stats.append(sample_stats(samples, lines))
+            stats = np.mean(stats, axis=0)
+            print('{:<12}{:<8}{:>12.2f}{:>16.2f}{:>18.3f}{:>12.3f}'.format(
+                backend, str(styles is not None), num_repeats * len(lines) / elapsed, *stats))
+
@@ -0,0 +1,93 @@
+"""
+Times the drawing operations applied line by line against the same operations applied to a whole page at
+once through drawing.RaggedStrokes, and checks that both give exactly the same points (interpolate, which
+solves for the splines of the whole page together, to within TOLERANCE).  Pages are made of the
+handwriting of the style files (float32 offsets, like sampled ones), so no model is needed.
+
+    python -m benchmarks.ragged_strokes [lines_per_page]
+"""
+import sys
+import time
+
+import numpy as np
+
+from handwriting_synthesis import drawing
+from handwriting_synthesis.config import style_path
+from handwriting_synthesis.hand import _draw
+
+STYLES = range(13)
+REPEATS = 5
+TOLERANCE = 1e-8
+
+
+def reference_layout(strokes, lines, line_height=60, view_width=1000):
+    """_layout as it was, one line at a time"""
+    coords = []
+    initial_coord = np.array([0, -(3 * line_height / 4)])
+    for offsets, line in zip(strokes, lines):
+        if not line:
+            coords.append(None)
+            initial_coord[1] -= line_height
+            continue
+
+        offsets[:, :2] *= 1.5
+        line_coords = drawing.offsets_to_coords(offsets)
+        line_coords = drawing.denoise(line_coords)
+        line_coords[:, :2] = drawing.align(line_coords[:, :2])
+        line_coords[:, 1] *= -1
+        line_coords[:, :2] -= line_coords[:, :2].min() + initial_coord
+        line_coords[:, 0] += (view_width - line_coords[:, 0].max()) / 2
+        coords.append(line_coords)
+        initial_coord[1] -= line_height
+    return coords
+
+
+def timed(function):
+    function()
+    start = time.time()
+    for _ in range(REPEATS):
+        result = function()
+    return result, (time.time() - start) / REPEATS
+
+
+def max_difference(a, b):
+    return max([np.abs(x - y).max() for x, y in zip(a, b) if x is not None] + [0.0])
+
+
+if __name__ == '__main__':
+    lines_per_page = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    offsets = [
+        np.load('{}/style-{}-strokes.npy'.format(style_path, STYLES[i % len(STYLES)]))
+        for i in range(lines_per_page)
+    ]
+    coords = [drawing.offsets_to_coords(o) for o in offsets]
+    lines = ['line'] * lines_per_page
+    page = drawing.RaggedStrokes.from_lines(offsets)
+    coords_page = drawing.RaggedStrokes.from_lines(coords)
+
+    operations = [
+        ('offsets_to_coords',
+         lambda: [drawing.offsets_to_coords(o) for o in offsets],
+         lambda: page.offsets_to_coords().to_lines()),
+        ('denoise',
+         lambda: [drawing.denoise(c) for c in coords],
+         lambda: coords_page.denoise().to_lines()),
+        ('interpolate',
+         lambda: [drawing.interpolate(c) for c in coords],
+         lambda: coords_page.interpolate().to_lines()),
+        ('align',
+         lambda: [drawing.align(c) for c in coords],
+         lambda: coords_page.align().to_lines()),
+        ('layout',
+         lambda: reference_layout([o.copy() for o in offsets], lines),
+         lambda: _draw._layout(offsets, lines)[2]),
+    ]
+
+    print('{:<20}{:>14}{:>14}{:>10}{:>14}'.format('operation', 'lines secs', 'page secs', 'speedup', 'max diff'))
+    for name, by_line, by_page in operations:
+        reference, line_secs = timed(by_line)
+        batched, page_secs = timed(by_page)
+        difference = max_difference(reference, batched)
+        print('{:<20}{:>14.4f}{:>14.4f}{:>10.1f}{:>14.2e}'.format(
+            name, line_secs, page_secs, line_secs / page_secs, difference))
+        assert difference <= (TOLERANCE if name == 'interpolate' else 0.0)
@@ -0,0 +1,53 @@
+"""
+Throughput of rendering pages to png with the numpy rasterizer, against rendering them to svg (which then
+still has to be rasterized elsewhere).  Pages are made of the handwriting of the style files, so no model
+is needed, and both renderers include the same post-processing (denoise, align and layout).
+
+    python -m benchmarks.raster [num_pages]
+"""
+import sys
+import time
+
+import numpy as np
+
+from handwriting_synthesis.config import style_path
+from handwriting_synthesis.hand._draw import _document
+from handwriting_synthesis.hand._raster import _png, _raster
+
+LINES_PER_PAGE = 20
+STYLES = range(13)
+
+
+def load_page(page):
+    styles = [STYLES[(page + i) % len(STYLES)] for i in range(LINES_PER_PAGE)]
+    strokes = [np.load('{}/style-{}-strokes.npy'.format(style_path, style)) for style in styles]
+    lines = [str(np.load('{}/style-{}-chars.npy'.format(style_path, style)).tobytes().decode('utf-8'))
+             for style in styles]
+    return strokes, lines
+
+
+def throughput(render, pages):
+    render(*pages[0])
+    start = time.time()
+    for strokes, lines in pages:
+        render(strokes, lines)
+    return len(pages) * LINES_PER_PAGE / (time.time() - start)
+
+
+if __name__ == '__main__':
+    num_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    pages = [load_page(page) for page in range(num_pages)]
+
+    def copied(render):
+        return lambda strokes, lines: render([s.copy() for s in strokes], lines)
+
+    renderers = [('svg', copied(lambda strokes, lines: _document(strokes, lines, direct=True)))]
+    for dpi in [96, 150, 300]:
+        renderers.append(('png {} dpi'.format(dpi), copied(
+            lambda strokes, lines, dpi=dpi: _png(_raster(strokes, lines, dpi=dpi), dpi=dpi))))
+        renderers.append(('raster {} dpi'.format(dpi), copied(
+            lambda strokes, lines, dpi=dpi: _raster(strokes, lines, dpi=dpi))))
+
+    print('{:<16}{:>12}'.format('output', 'lines/sec'))
+    for name, render in renderers:
+        print('{:<16}{:>12.1f}'.format(name, throughput(render, pages)))
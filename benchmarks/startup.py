@@ -0,0 +1,57 @@
+"""
+Compares worker start time for a Hand restored from the checkpoint against one loaded from the
+frozen graph written by handwriting_synthesis.hand.export.  Each measurement runs in a fresh
+interpreter so that import costs are included.
+
+    python -m benchmarks.startup [num_runs]
+"""
+import json
+import os
+import subprocess
+import sys
+
+from handwriting_synthesis.config import frozen_graph_path
+
+WORKER = """
+import json, resource, time
+start = time.time()
+from handwriting_synthesis.hand import Hand
+imported = time.time()
+hand = Hand({hand_args})
+loaded = time.time()
+hand._sample(['A quick warm up line'], biases=[.75])
+sampled = time.time()
+print(json.dumps({{
+    'import': imported - start,
+    'load': loaded - imported,
+    'first_sample': sampled - loaded,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+"""
+
+
+def run_worker(hand_args):
+    output = subprocess.check_output(
+        [sys.executable, '-c', WORKER.format(hand_args=hand_args)],
+        env=dict(os.environ, TF_CPP_MIN_LOG_LEVEL='3'),
+        stderr=subprocess.DEVNULL,
+    )
+    return json.loads(output.decode('utf-8').strip().split('\n')[-1])
+
+
+if __name__ == '__main__':
+    num_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    if not os.path.exists(frozen_graph_path):
+        from handwriting_synthesis.hand import export
+        export(frozen_graph_path)
+
+    variants = [
+        ('checkpoint', ''),
+        ('frozen', 'frozen_graph={!r}'.format(frozen_graph_path)),
+    ]
+    print('{:<12}{:>10}{:>10}{:>14}{:>14}'.format('variant', 'import', 'load', 'first_sample', 'max_rss_mb'))
+    for name, hand_args in variants:
+        runs = [run_worker(hand_args) for _ in range(num_runs)]
+        mean = {key: sum(run[key] for run in runs) / num_runs for key in runs[0]}
+        print('{:<12}{:>10.2f}{:>10.2f}{:>14.2f}{:>14.0f}'.format(
+            name, mean['import'], mean['load'], mean['first_sample'], mean['max_rss_mb']))
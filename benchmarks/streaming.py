@@ -0,0 +1,61 @@
+"""
+Latency and throughput of Hand.stream against one-shot sampling with Hand._sample.
+
+For each chunk size, reports the time until the first chunk of strokes is yielded, the time until the
+last one is, and the resulting lines/sec.  One-shot sampling only returns once every line is finished,
+so its first and last strokes arrive together.  Steps/char of the streamed samples is reported as a
+check that they run as long as one-shot samples.
+
+    python -m benchmarks.streaming [num_repeats]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.style_cache import LINES, STYLES
+from handwriting_synthesis.hand import Hand
+
+CHUNK_SIZES = [10, 40, 160]
+
+
+def one_shot(hand, lines, styles):
+    start = time.time()
+    samples = hand._sample(lines, styles=styles)
+    elapsed = time.time() - start
+    return elapsed, elapsed, samples
+
+
+def streamed(hand, lines, styles, chunk_size):
+    start = time.time()
+    first = None
+    chunks = []
+    for chunk in hand.stream(lines, styles=styles, chunk_size=chunk_size):
+        if first is None:
+            first = time.time() - start
+        chunks.append(chunk)
+    samples = [np.concatenate([chunk[i] for chunk in chunks]) for i in range(len(lines))]
+    return first, time.time() - start, samples
+
+
+if __name__ == '__main__':
+    num_repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    hand = Hand(state_sampling=True)
+    lines = LINES * len(STYLES)
+    num_chars = sum(len(line) for line in lines)
+
+    print('{:<8}{:<10}{:>14}{:>12}{:>12}{:>12}'.format(
+        'styled', 'chunk', 'first_secs', 'last_secs', 'lines/sec', 'steps/char'))
+    for styles in [None, np.repeat(STYLES, len(LINES))]:
+        runs = [('one-shot', lambda: one_shot(hand, lines, styles))] + [
+            (str(chunk_size), lambda chunk_size=chunk_size: streamed(hand, lines, styles, chunk_size))
+            for chunk_size in CHUNK_SIZES
+        ]
+        for name, run in runs:
+            run()
+            results = [run() for _ in range(num_repeats)]
+            first = np.mean([r[0] for r in results])
+            last = np.mean([r[1] for r in results])
+            steps = np.mean([sum(len(s) for s in r[2]) for r in results]) / num_chars
+            print('{:<8}{:<10}{:>14.3f}{:>12.3f}{:>12.2f}{:>12.2f}'.format(
+                str(styles is not None), name, first, last, len(lines) / last, steps))
@@ -0,0 +1,82 @@
+"""
+Quality check and timing for Hand's style-state cache.
+
+For each style, compares the state reached by priming with the full text (priming text, a space and
+the line) against the cached state computed from the priming text alone, with kappa re-based onto the
+line.  Then samples the same lines repeatedly with full priming and with cached states and compares
+the sample statistics and sampling time.
+
+    python -m benchmarks.style_cache [num_repeats]
+"""
+import sys
+import time
+
+import numpy as np
+
+from handwriting_synthesis import drawing
+from handwriting_synthesis.hand import FrozenRNN, Hand
+
+LINES = [
+    "Father time, I'm running late",
+    "I'm winding down, I'm growing tired",
+    "Seconds drift into the night",
+    "The clock just ticks till my time expires",
+]
+STYLES = [1, 5, 9, 12]
+
+
+def full_primed_state(hand, style, line):
+    x_p, c_p = hand._load_style(style)
+    chars = drawing.encode_ascii(c_p + " " + line)
+    primed_state = hand.nn.session.run(
+        hand.nn.primed_state,
+        feed_dict={
+            hand.nn.x_prime: x_p[np.newaxis],
+            hand.nn.x_prime_len: [len(x_p)],
+            hand.nn.num_samples: 1,
+            hand.nn.c: chars[np.newaxis],
+            hand.nn.c_len: [len(chars)],
+        }
+    )
+    state = dict(zip(FrozenRNN.state_fields, primed_state))
+    state['kappa'] = state['kappa'] - (len(c_p) + 1)
+    return state
+
+
+def sample_stats(samples, lines):
+    steps_per_char = [len(sample) / len(line) for sample, line in zip(samples, lines)]
+    strokes_per_char = [sample[:, 2].sum() / len(line) for sample, line in zip(samples, lines)]
+    step_size = [np.linalg.norm(sample[:, :2], axis=1).mean() for sample in samples]
+    return np.mean(steps_per_char), np.mean(strokes_per_char), np.mean(step_size)
+
+
+if __name__ == '__main__':
+    num_repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    hand = Hand(state_sampling=True)
+
+    print('max abs difference between full priming and cached state')
+    print('{:>6}  {}'.format('style', '  '.join('{:>7}'.format(f) for f in ['h3', 'c3', 'w', 'kappa'])))
+    for style in STYLES:
+        cached = hand._style_state(style)
+        diffs = {field: 0.0 for field in ['h3', 'c3', 'w', 'kappa']}
+        for line in LINES:
+            full = full_primed_state(hand, style, line)
+            for field in diffs:
+                diffs[field] = max(diffs[field], np.abs(full[field] - cached[field]).max())
+        print('{:>6}  {}'.format(style, '  '.join('{:>7.4f}'.format(diffs[f]) for f in diffs)))
+
+    lines = LINES * len(STYLES)
+    styles = np.repeat(STYLES, len(LINES))
+    biases = [.75] * len(lines)
+    print()
+    print('{:<8}{:>10}{:>16}{:>18}{:>12}'.format('mode', 'secs', 'steps/char', 'strokes/char', 'step size'))
+    for name, cache_styles in [('full', False), ('cached', True)]:
+        hand.cache_styles = cache_styles
+        stats, elapsed = [], 0
+        for _ in range(num_repeats):
+            start = time.time()
+            samples = hand._sample(lines, biases=biases, styles=styles)
+            elapsed += time.time() - start
+            stats.append(sample_stats(samples, lines))
+        stats = np.mean(stats, axis=0)
+        print('{:<8}{:>10.2f}{:>16.2f}{:>18.3f}{:>12.3f}'.format(name, elapsed / num_repeats, *stats))
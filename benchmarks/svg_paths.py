@@ -0,0 +1,78 @@
+"""
+Checks that _draw's path data matches the per-point string formatting it replaced, byte for byte, and
+times both, along with whole documents drawn through svgwrite and directly from templates, in memory and
+through a temporary file that is read back.
+
+Strokes are random walks shaped like sampled lines (about 40 points per character, with a pen up every
+few points), so no model is needed.
+
+    python -m benchmarks.svg_paths [num_lines]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from handwriting_synthesis.hand._draw import _draw, _path_data
+
+
+def reference_path_data(strokes, precision=None):
+    number = '{}' if precision is None else '{{:.{}f}}'.format(precision)
+    p = "M{},{} ".format(0, 0)
+    prev_eos = 1.0
+    for x, y, eos in zip(*strokes.T):
+        p += ('{}' + number + ',' + number + ' ').format('M' if prev_eos == 1.0 else 'L', x, y)
+        prev_eos = eos
+    return p
+
+
+def random_offsets(num_points, rng):
+    offsets = rng.normal(size=[num_points, 3]).astype(np.float32)
+    offsets[:, 2] = rng.random(num_points) < .05
+    return offsets
+
+
+def timed(function, *args, **kwargs):
+    start = time.time()
+    result = function(*args, **kwargs)
+    return result, time.time() - start
+
+
+if __name__ == '__main__':
+    num_lines = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    rng = np.random.default_rng(0)
+    lines = ['x' * rng.integers(20, 60) for _ in range(num_lines)]
+    offsets = [random_offsets(40 * len(line), rng) for line in lines]
+    coords = [np.cumsum(o.astype(np.float64), axis=0) for o in offsets]
+    for c, o in zip(coords, offsets):
+        c[:, 2] = o[:, 2]
+
+    print('{:<16}{:>14}{:>14}{:>10}{:>10}'.format('path data', 'loop secs', 'vector secs', 'speedup', 'equal'))
+    for precision in [None, 2]:
+        reference, loop_secs = timed(lambda: [reference_path_data(c, precision) for c in coords])
+        vectorized, vector_secs = timed(lambda: [_path_data(c, precision) for c in coords])
+        print('{:<16}{:>14.4f}{:>14.4f}{:>10.1f}{:>10}'.format(
+            'precision={}'.format(precision), loop_secs, vector_secs, loop_secs / vector_secs,
+            str(reference == vectorized)))
+
+    print()
+    print('{:<16}{:>14}{:>10}'.format('document', 'secs', 'kb'))
+    _draw([offsets[0].copy()], lines[:1], None)
+    documents = {}
+    for direct in [False, True]:
+        documents[direct], secs = timed(_draw, [o.copy() for o in offsets], lines, None, direct=direct)
+        print('{:<16}{:>14.4f}{:>10.0f}'.format(
+            'direct' if direct else 'svgwrite', secs, len(documents[direct]) / 1024))
+
+    def through_file():
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'page.svg')
+            _draw([o.copy() for o in offsets], lines, filename)
+            with open(filename, 'rb') as f:
+                return f.read()
+
+    documents['file'], secs = timed(through_file)
+    print('{:<16}{:>14.4f}{:>10.0f}'.format('svgwrite, file', secs, len(documents['file']) / 1024))
+    print('identical documents: {}'.format(documents[False] == documents[True] == documents['file']))
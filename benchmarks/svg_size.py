@@ -0,0 +1,108 @@
+"""
+Size of the demo documents main.py writes (img/*.svg) when they are written with fixed precision, relative
+path commands and stroke simplification, and the time taken to encode them.  The points are read back from
+the documents in img, which are already laid out, so no model is needed; simplification is applied to them
+as _layout applies it after denoise and align.
+
+The paths are read back, and the largest distance of an original point to the lines drawn through its
+stroke is reported, in svg units (a line is 60 units high).
+
+    python -m benchmarks.svg_size [tolerance ...]
+"""
+import glob
+import re
+import sys
+import time
+
+import numpy as np
+
+from handwriting_synthesis import drawing
+from handwriting_synthesis.hand._draw import _attribute, _path_data, _svg_footer, _svg_header, _svg_path
+
+DOCUMENTS = ['img/usage_demo.svg', 'img/all_star.svg', 'img/downtown.svg', 'img/give_up.svg']
+REPEATS = 5
+
+
+def read_document(filename):
+    """The view box and the [x, y, eos] points, color and width of each path of an svg written by _draw"""
+    with open(filename) as f:
+        svg = f.read()
+    width, height = re.search(r'viewBox="0,0,(\d+),(\d+)"', svg).groups()
+    paths = []
+    for d, color, stroke_width in re.findall(r'<path d="([^"]*)" fill="none" stroke="([^"]*)" '
+                                             r'stroke-linecap="round" stroke-width="([^"]*)"', svg):
+        commands = re.findall(r'([ML])([^, ]+),([^ ]+)', d)[1:]
+        coords = np.array([[float(x), float(y), 0.0] for _, x, y in commands])
+        # a point ends a stroke if the next one starts one
+        coords[:-1, 2] = [command == 'M' for command, _, _ in commands[1:]]
+        coords[-1, 2] = 1.0
+        paths.append((coords, color, stroke_width))
+    return int(width), int(height), paths
+
+
+def write_document(width, height, paths, precision=None, simplify=None, relative=False):
+    if simplify is not None:
+        paths = [(drawing.simplify(coords, simplify), color, width) for coords, color, width in paths]
+    return _svg_header.format(width=width, height=height) + ''.join(
+        _svg_path.format(d=_path_data(coords, precision, relative), color=_attribute(color),
+                         width=_attribute(stroke_width))
+        for coords, color, stroke_width in paths
+    ) + _svg_footer
+
+
+def read_strokes(d):
+    """The [x, y] points of each stroke of path data written by _path_data"""
+    if d.startswith('M0,0 '):
+        commands = re.findall(r'([ML])([^, ]+),([^ ]+)', d[len('M0,0 '):])
+        points = np.array([[float(x), float(y)] for _, x, y in commands])
+    else:
+        commands = re.findall(r'(m| )([^, m]+),([^ m]+)', d)
+        points = np.cumsum([[float(x), float(y)] for _, x, y in commands], axis=0)
+    starts = [i for i, (command, _, _) in enumerate(commands) if command in 'Mm']
+    return np.split(points, starts[1:])
+
+
+def max_error(paths, svg):
+    """Largest distance of a point of paths to the lines through the points of its stroke in svg"""
+    error = 0.0
+    for (coords, _, _), d in zip(paths, re.findall(r'<path d="([^"]*)"', svg)):
+        strokes = np.split(coords[:, :2], np.where(coords[:-1, 2] == 1)[0] + 1)
+        written = read_strokes(d)
+        assert len(strokes) == len(written)
+        for points, line in zip(strokes, written):
+            a, b = line[np.maximum(np.arange(len(line)) - 1, 0)], line
+            ab, ap = b - a, points[:, np.newaxis] - a
+            t = np.clip(np.sum(ap * ab, axis=2) / np.maximum(np.sum(ab * ab, axis=1), 1e-12), 0.0, 1.0)
+            error = max(error, np.hypot(*np.moveaxis(ap - t[..., np.newaxis] * ab, 2, 0)).min(axis=1).max())
+    return error
+
+
+def timed(function):
+    function()
+    start = time.time()
+    for _ in range(REPEATS):
+        result = function()
+    return result, (time.time() - start) / REPEATS
+
+
+if __name__ == '__main__':
+    tolerances = [float(tolerance) for tolerance in sys.argv[1:]] or [0.1, 0.25, 0.5]
+    documents = [read_document(filename) for filename in DOCUMENTS if glob.glob(filename)]
+    num_points = sum(len(coords) for _, _, paths in documents for coords, _, _ in paths)
+
+    variants = [('as written', {}), ('precision=2', {'precision': 2}),
+                ('relative, precision=2', {'precision': 2, 'relative': True}),
+                ('relative, precision=1', {'precision': 1, 'relative': True})]
+    for tolerance in tolerances:
+        variants.append(('+ simplify={}'.format(tolerance), dict(variants[-1][1], simplify=tolerance)))
+
+    print('{} documents, {} points'.format(len(documents), num_points))
+    print('{:<26}{:>10}{:>10}{:>12}{:>12}{:>12}'.format('encoding', 'kb', 'size', 'secs', 'time', 'max error'))
+    baseline_size = baseline_secs = None
+    for name, kwargs in variants:
+        svgs, secs = timed(lambda: [write_document(*document, **kwargs) for document in documents])
+        size = sum(len(svg.encode('utf-8')) for svg in svgs)
+        baseline_size, baseline_secs = baseline_size or size, baseline_secs or secs
+        error = max(max_error(paths, svg) for (_, _, paths), svg in zip(documents, svgs))
+        print('{:<26}{:>10.1f}{:>9.0f}%{:>12.4f}{:>11.0f}%{:>12.3f}'.format(
+            name, size / 1024, 100 * size / baseline_size, secs, 100 * secs / baseline_secs, error))
@@ -0,0 +1,39 @@
+"""
+Compares Hand with and without XLA compilation of the sampling graph (Hand(xla=True)).  For each batch
+size, the first call includes compiling every cluster for the batch's shapes, and the following calls
+(same batch size and character bucket) report the steady-state sampled steps/sec.
+
+    python -m benchmarks.xla [num_repeats]
+"""
+import sys
+import time
+
+from handwriting_synthesis.hand import Hand
+
+LINES = [
+    "Somebody once told me",
+    "the world is gonna roll me",
+    "Walking fast",
+    "Faces pass",
+    "Never gonna give you up",
+    "Seconds drift into the night",
+]
+
+
+def run(hand, lines):
+    start = time.time()
+    samples = hand._sample(lines, biases=[.75] * len(lines))
+    return time.time() - start, sum(len(sample) for sample in samples)
+
+
+if __name__ == '__main__':
+    num_repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    print('{:<6}{:>8}{:>14}{:>14}'.format('xla', 'batch', 'first secs', 'steps/sec'))
+    # the XLA hand comes first, since XLA only auto-clusters on CPU if enabled before any session has run
+    for xla in [True, False]:
+        hand = Hand(xla=xla)
+        for batch_size in [1, 8, 32]:
+            lines = [LINES[i % len(LINES)] for i in range(batch_size)]
+            first, _ = run(hand, lines)
+            elapsed, steps = zip(*[run(hand, lines) for _ in range(num_repeats)])
+            print('{:<6}{:>8}{:>14.2f}{:>14.0f}'.format(str(xla), batch_size, first, sum(steps) / sum(elapsed)))
@@ -11,3 +11,6 @@ ascii_data_path: str = os.path.join(raw_data_path, "ascii")
 checkpoint_path: str = os.path.join(BASE_PATH, "checkpoint")
 prediction_path: str = os.path.join(BASE_PATH, "prediction")
 style_path: str = os.path.join(BASE_PATH, "style")
+export_path: str = os.path.join(BASE_PATH, "export")
+frozen_graph_path: str = os.path.join(export_path, "sampler.pb")
+session_profile_path: str = os.path.join(export_path, "session.json")
@@ -0,0 +1,89 @@
+import numpy as np
+
+from handwriting_synthesis.drawing.operations import _denoise_strokes, _interpolate_strokes, _simplify_strokes, align
+
+
+class RaggedStrokes(object):
+    """
+    The [x, y, eos] points of many lines (a page, or a sampled batch) in one flat array, so that the
+    operations of drawing.operations can be applied to every line at once instead of line by line.
+
+    Line i is coords[line_offsets[i]:line_offsets[i + 1]].  Its strokes end after every point whose eos is 1
+    and at the end of the line; stroke_offsets holds their boundaries in the same form, so a stroke never
+    runs from one line into the next.
+
+    Args:
+        coords: [num_points, 3] array of the points of every line, one line after the other.
+        line_offsets: [num_lines + 1] array of the index of the first point of each line, followed by
+            num_points.
+    """
+
+    def __init__(self, coords, line_offsets):
+        self.coords = coords
+        self.line_offsets = np.asarray(line_offsets, dtype=np.int64)
+        assert self.line_offsets[0] == 0 and self.line_offsets[-1] == len(coords)
+        stroke_ends = np.flatnonzero(coords[:, 2] == 1) + 1
+        self.stroke_offsets = np.union1d(stroke_ends, self.line_offsets)
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Copies a list of [num_points, 3] arrays, one per line, into one RaggedStrokes"""
+        lengths = [len(line) for line in lines]
+        coords = np.concatenate(lines) if lines else np.zeros([0, 3])
+        return cls(coords, np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]))
+
+    def to_lines(self):
+        """The points of each line, as views of coords"""
+        return np.split(self.coords, self.line_offsets[1:-1])
+
+    @property
+    def num_lines(self):
+        return len(self.line_offsets) - 1
+
+    @property
+    def num_strokes(self):
+        return len(self.stroke_offsets) - 1
+
+    def line_ids(self):
+        """Index of the line of every point"""
+        return np.repeat(np.arange(self.num_lines), np.diff(self.line_offsets))
+
+    def offsets_to_coords(self):
+        """
+        drawing.offsets_to_coords of every line.  Each line is summed on its own, in the dtype of the
+        offsets, so that the points are exactly those drawing.offsets_to_coords gives.
+        """
+        coords = np.copy(self.coords)
+        for start, end in zip(self.line_offsets[:-1], self.line_offsets[1:]):
+            np.cumsum(self.coords[start:end, :2], axis=0, out=coords[start:end, :2])
+        return RaggedStrokes(coords, self.line_offsets)
+
+    def denoise(self):
+        """drawing.denoise of every line, as one convolution over every stroke"""
+        xy = _denoise_strokes(self.coords[:, :2], self.stroke_offsets)
+        coords = np.concatenate([xy, self.coords[:, 2:3]], axis=1)
+        return RaggedStrokes(coords, self.line_offsets)
+
+    def interpolate(self, factor=2):
+        """drawing.interpolate of every line, with the splines of every stroke fit at once"""
+        coords, stroke_offsets = _interpolate_strokes(self.coords, self.stroke_offsets, factor)
+        # the lines start where their first strokes do
+        line_offsets = stroke_offsets[np.searchsorted(self.stroke_offsets, self.line_offsets)]
+        return RaggedStrokes(coords, line_offsets)
+
+    def align(self):
+        """
+        drawing.align of every line.  Each line's fit is a 2x2 least squares problem, which is solved with
+        the same operations as drawing.align, so that the points come out exactly the same.
+        """
+        coords = np.copy(self.coords)
+        for start, end in zip(self.line_offsets[:-1], self.line_offsets[1:]):
+            if end > start:
+                coords[start:end, :2] = align(self.coords[start:end, :2])
+        return RaggedStrokes(coords, self.line_offsets)
+
+    def simplify(self, tolerance):
+        """drawing.simplify of every line, with the strokes of every line simplified at once"""
+        keep = _simplify_strokes(self.coords[:, :2], self.stroke_offsets, tolerance)
+        kept_before = np.concatenate([[0], np.cumsum(keep)])
+        return RaggedStrokes(self.coords[keep], kept_before[self.line_offsets])
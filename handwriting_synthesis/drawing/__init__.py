@@ -1 +1,2 @@
 from .operations import *
+from .RaggedStrokes import RaggedStrokes
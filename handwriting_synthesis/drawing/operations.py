@@ -4,8 +4,9 @@ from collections import defaultdict
 
 import matplotlib.pyplot as plt
 import numpy as np
-from scipy.interpolate import interp1d
-from scipy.signal import savgol_filter
+from scipy.linalg import solve_banded
+from scipy.ndimage import correlate1d
+from scipy.signal import savgol_coeffs
 
 alphabet = [
     '\x00', ' ', '!', '"', '#', "'", '(', ')', ',', '-', '.',
@@ -23,6 +24,9 @@ num_to_alpha = dict(enumerate(alphabet_ord))
 MAX_STROKE_LEN = 1200
 MAX_CHAR_LEN = 75
 
+# the weights of savgol_filter(x, 7, 3), the filter denoise applies to every stroke
+_denoise_coeffs = savgol_coeffs(7, 3)
+
 
 def align(coords):
     """
@@ -81,52 +85,156 @@ def denoise(coords):
     """
     smoothing filter to mitigate some artifacts of the data collection
     """
-    coords = np.split(coords, np.where(coords[:, 2] == 1)[0] + 1, axis=0)
-    new_coords = []
-    for stroke in coords:
-        if len(stroke) != 0:
-            x_new = savgol_filter(stroke[:, 0], 7, 3, mode='nearest')
-            y_new = savgol_filter(stroke[:, 1], 7, 3, mode='nearest')
-            xy_coords = np.hstack([x_new.reshape(-1, 1), y_new.reshape(-1, 1)])
-            stroke = np.concatenate([xy_coords, stroke[:, 2].reshape(-1, 1)], axis=1)
-            new_coords.append(stroke)
-
-    coords = np.vstack(new_coords)
-    return coords
+    stroke_offsets = np.union1d(np.where(coords[:, 2] == 1)[0] + 1, [0, len(coords)])
+    return np.concatenate([_denoise_strokes(coords[:, :2], stroke_offsets), coords[:, 2:3]], axis=1)
 
 
-def interpolate(coords, factor=2):
+def _denoise_strokes(xy, stroke_offsets):
     """
-    interpolates strokes using cubic spline
+    savgol_filter(..., 7, 3, mode='nearest') of the x and y of each stroke, stroke i being
+    xy[stroke_offsets[i]:stroke_offsets[i + 1]], as one convolution over every stroke.  Each stroke is
+    padded with copies of its end points, as mode='nearest' pads it, so no stroke is smoothed with the
+    points of its neighbours.
     """
-    coords = np.split(coords, np.where(coords[:, 2] == 1)[0] + 1, axis=0)
-    new_coords = []
-    for stroke in coords:
+    if len(xy) == 0:
+        return np.zeros([0, 2], dtype=xy.dtype)
+    half = len(_denoise_coeffs) // 2
+    starts = stroke_offsets[:-1]
+    lengths = np.diff(stroke_offsets)
+    padded_lengths = lengths + 2 * half
+    stroke = np.repeat(np.arange(len(lengths)), padded_lengths)
+    # position of every point of the padded strokes within its stroke, from -half to length + half - 1
+    position = np.arange(len(stroke)) - np.repeat(np.cumsum(padded_lengths) - padded_lengths, padded_lengths)
+    position -= half
+    padded = xy[starts[stroke] + np.clip(position, 0, lengths[stroke] - 1)]
+    if padded.dtype not in (np.float32, np.float64):
+        padded = padded.astype(np.float64)
+    smoothed = correlate1d(padded, _denoise_coeffs, axis=0)
+    return smoothed[(position >= 0) & (position < lengths[stroke])]
 
-        if len(stroke) == 0:
-            continue
 
-        xy_coords = stroke[:, :2]
+def interpolate(coords, factor=2):
+    """
+    interpolates strokes using cubic spline
+    """
+    stroke_offsets = np.union1d(np.where(coords[:, 2] == 1)[0] + 1, [0, len(coords)])
+    return _interpolate_strokes(coords, stroke_offsets, factor)[0]
 
-        if len(stroke) > 3:
-            f_x = interp1d(np.arange(len(stroke)), stroke[:, 0], kind='cubic')
-            f_y = interp1d(np.arange(len(stroke)), stroke[:, 1], kind='cubic')
 
-            xx = np.linspace(0, len(stroke) - 1, factor * (len(stroke)))
-            yy = np.linspace(0, len(stroke) - 1, factor * (len(stroke)))
+def _interpolate_strokes(coords, stroke_offsets, factor=2):
+    """
+    interpolate of each stroke, stroke i being coords[stroke_offsets[i]:stroke_offsets[i + 1]], for every
+    stroke at once.  Strokes of more than 3 points are resampled at factor times as many points along the
+    not-a-knot cubic spline through them, which interp1d(kind='cubic') fits; shorter strokes are kept as
+    they are.  The last point of every stroke ends it.
 
-            x_new = f_x(xx)
-            y_new = f_y(yy)
+    The splines of every stroke are fit together, as one banded system of equations for the second
+    derivatives at the points (the knots are one apart), which is 0 between strokes.
 
-            xy_coords = np.hstack([x_new.reshape(-1, 1), y_new.reshape(-1, 1)])
+    Returns the new points and their stroke offsets.
+    """
+    starts = stroke_offsets[:-1]
+    lengths = np.diff(stroke_offsets)
+    fitted = lengths > 3
+    new_lengths = np.where(fitted, factor * lengths, lengths)
+    new_offsets = np.concatenate([[0], np.cumsum(new_lengths)])
+
+    # position of every point within its stroke, of the old points and of the new ones
+    stroke = np.repeat(np.arange(len(lengths)), lengths)
+    position = np.arange(len(stroke)) - starts[stroke]
+    new_stroke = np.repeat(np.arange(len(lengths)), new_lengths)
+    new_position = np.arange(len(new_stroke)) - new_offsets[new_stroke]
+
+    xy = coords[:, :2].astype(np.float64)
+    new_xy = np.empty([len(new_stroke), 2])
+    copied = ~fitted[new_stroke]
+    new_xy[copied] = xy[starts[new_stroke[copied]] + new_position[copied]]
+
+    if fitted.any():
+        # the rows of the fitted points: y''[i - 1] + 4 y''[i] + y''[i + 1] = 6 (y[i - 1] - 2 y[i] + y[i + 1])
+        # inside a stroke and continuous third derivatives at its second and second to last points
+        knots = np.flatnonzero(fitted[stroke])
+        n, i = lengths[stroke[knots]], position[knots]
+        first, last = i == 0, i == n - 1
+        inner = ~(first | last)
+        # bands[2 - k, j] holds the coefficient of y''[j] in row j - k
+        bands = np.zeros([5, len(knots)])
+        bands[2] = np.where(inner, 4, 1)
+        bands[1, 1:] = np.where(first, -2, inner)[:-1]
+        bands[0, 2:] = first[:-2]
+        bands[3, :-1] = np.where(last, -2, inner)[1:]
+        bands[4, :-2] = last[2:]
+        rhs = np.zeros([len(knots), 2])
+        j = knots[inner]
+        rhs[inner] = 6 * (xy[j - 1] - 2 * xy[j] + xy[j + 1])
+        second = np.zeros_like(xy)
+        second[knots] = solve_banded((2, 2), bands, rhs)
+
+        # every new point lies on the segment between two knots, u of the way along it
+        new_points = np.flatnonzero(~copied)
+        n = lengths[new_stroke[new_points]]
+        t = new_position[new_points] * ((n - 1) / (factor * n - 1))
+        segment = np.minimum(np.floor(t).astype(np.int64), n - 2)
+        u = (t - segment)[:, np.newaxis]
+        a = starts[new_stroke[new_points]] + segment
+        b = a + 1
+        new_xy[new_points] = (
+            second[a] * (1 - u) ** 3 / 6 + second[b] * u ** 3 / 6 +
+            (xy[a] - second[a] / 6) * (1 - u) + (xy[b] - second[b] / 6) * u
+        )
+
+    eos = np.zeros([len(new_xy), 1])
+    eos[new_offsets[1:] - 1] = 1.0
+    return np.concatenate([new_xy, eos], axis=1), new_offsets
+
+
+def simplify(coords, tolerance):
+    """
+    simplifies strokes with the Ramer-Douglas-Peucker algorithm, keeping only the points needed for the
+    polyline through them to stay within tolerance of every point
+    """
+    stroke_offsets = np.union1d(np.where(coords[:, 2] == 1)[0] + 1, [0, len(coords)])
+    return coords[_simplify_strokes(coords[:, :2], stroke_offsets, tolerance)]
 
-        stroke_eos = np.zeros([len(xy_coords), 1])
-        stroke_eos[-1] = 1.0
-        stroke = np.concatenate([xy_coords, stroke_eos], axis=1)
-        new_coords.append(stroke)
 
-    coords = np.vstack(new_coords)
-    return coords
+def _simplify_strokes(xy, stroke_offsets, tolerance):
+    """
+    Ramer-Douglas-Peucker simplification of each stroke, stroke i being
+    xy[stroke_offsets[i]:stroke_offsets[i + 1]].  Returns a mask of the points kept: the ends of every stroke
+    and, recursively, the point farthest from the segment between two kept points while it is more than
+    tolerance away.  The segments of every stroke are split at once, one level of the recursion at a time.
+    """
+    keep = np.zeros(len(xy), dtype=bool)
+    first, last = stroke_offsets[:-1], stroke_offsets[1:] - 1
+    keep[first] = True
+    keep[last] = True
+
+    while True:
+        inner = last - first - 1
+        first, last, inner = first[inner > 0], last[inner > 0], inner[inner > 0]
+        if len(first) == 0:
+            return keep
+
+        segment = np.repeat(np.arange(len(first)), inner)
+        segment_starts = np.cumsum(inner) - inner
+        point = np.arange(len(segment)) - segment_starts[segment] + first[segment] + 1
+
+        # distance of each point to its segment
+        a, b = xy[first[segment]], xy[last[segment]]
+        ab, ap = b - a, xy[point] - a
+        length_2 = np.maximum(np.sum(ab * ab, axis=1), 1e-12)
+        t = np.clip(np.sum(ap * ab, axis=1) / length_2, 0.0, 1.0)
+        distance = np.hypot(*(ap - t[:, np.newaxis] * ab).T)
+
+        farthest_distance = np.maximum.reduceat(distance, segment_starts)
+        # the first of a segment's points at its farthest distance
+        farthest = np.flatnonzero(distance == farthest_distance[segment])
+        farthest = point[farthest[np.unique(segment[farthest], return_index=True)[1]]]
+
+        split = farthest_distance > tolerance
+        farthest = farthest[split]
+        keep[farthest] = True
+        first, last = np.concatenate([first[split], farthest]), np.concatenate([farthest, last[split]])
 
 
 def normalize(offsets):
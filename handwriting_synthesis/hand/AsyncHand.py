@@ -0,0 +1,88 @@
+import asyncio
+import functools
+import os
+import queue
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from handwriting_synthesis.hand.Hand import Hand
+from handwriting_synthesis.hand._draw import _draw
+
+
+class AsyncHand(object):
+    """
+    asyncio front end of a Hand.  Sampling (session runs) and drawing are blocking, so the coroutines run
+    them on a thread pool of max_concurrency threads, and at most that many run at a time while the event
+    loop keeps serving other tasks.  Further calls wait in the pool's queue.
+
+    Cancelling a call (or hitting its timeout) while it is queued removes it from the queue.  A session run
+    which has already started cannot be interrupted, so it runs to completion in the background and its
+    result is discarded.
+
+    Args:
+        hand: Hand used for sampling.  If None, one is created from hand_kwargs.  Unless session_options
+            are given, its tensorflow session is then given max(1, cores // max_concurrency) intra-op threads
+            and max_concurrency inter-op threads, so that concurrent session runs each get their share of the
+            cores instead of all of them contending for every core.
+        max_concurrency: Maximum number of batches of lines sampled or documents drawn at the same time.
+        timeout: Default timeout in seconds of each call, None for no timeout.
+        hand_kwargs: Passed on to Hand if hand is None.
+    """
+
+    def __init__(self, hand=None, max_concurrency=2, timeout=None, **hand_kwargs):
+        if hand is None:
+            hand_kwargs.setdefault('session_options', {
+                'intra_op_threads': max(1, (os.cpu_count() or 1) // max_concurrency),
+                'inter_op_threads': max_concurrency,
+            })
+            hand = Hand(**hand_kwargs)
+        self.hand = hand
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='AsyncHand')
+
+    async def sample(self, lines, biases=None, styles=None, timeout=None):
+        """Returns the strokes of each line, like Hand._sample"""
+        lines = list(lines)
+        self.hand._validate(lines)
+        return await self._run(
+            functools.partial(self.hand._sample, lines, biases=biases, styles=styles), self._timeout(timeout))
+
+    async def write(self, lines, biases=None, styles=None, stroke_colors=None, stroke_widths=None, timeout=None):
+        """
+        Returns the svg written by Hand.write, as bytes.  timeout applies to sampling and drawing together.
+        """
+        lines = list(lines)
+        self.hand._validate(lines)
+
+        # the steps run without deadlines of their own, so that timeout is the only one
+        async def write():
+            strokes = await self._run(functools.partial(self.hand._sample, lines, biases=biases, styles=styles))
+            return await self._run(
+                functools.partial(
+                    _draw, strokes, lines, None, stroke_colors=stroke_colors, stroke_widths=stroke_widths)
+            )
+
+        return await asyncio.wait_for(write(), self._timeout(timeout))
+
+    def close(self):
+        """Cancels queued calls and waits for running ones to finish"""
+        if sys.version_info >= (3, 9):
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            return
+        # cancel_futures is new in python 3.9, so the queued calls are cancelled here instead
+        while True:
+            try:
+                work_item = self._executor._work_queue.get_nowait()
+            except queue.Empty:
+                break
+            if work_item is not None:
+                work_item.future.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _timeout(self, timeout):
+        return timeout if timeout is not None else self.timeout
+
+    async def _run(self, function, timeout=None):
+        future = asyncio.get_running_loop().run_in_executor(self._executor, function)
+        return await asyncio.wait_for(future, timeout)
@@ -0,0 +1,44 @@
+from handwriting_synthesis.config import frozen_graph_path
+
+
+class FrozenRNN(object):
+    """
+    Runs a sampling graph written by handwriting_synthesis.hand.export without rebuilding
+    RNN/LSTMAttentionCell or restoring a checkpoint.  Exposes the same placeholders, sampled_sequence
+    and session attributes as RNN, so Hand can use either one.  xla and session_options (a dict of keyword
+    arguments) configure the session, see handwriting_synthesis.tf.utils.session_config.
+    """
+    input_names = [
+        'c', 'c_len', 'sample_tsteps', 'num_samples', 'prime', 'x_prime', 'x_prime_len', 'bias', 'chunk_initial_input'
+    ]
+    output_names = ['sampled_sequence', 'sampled_sequence_from_state', 'sampled_chunk']
+    state_fields = ['h1', 'c1', 'h2', 'c2', 'h3', 'c3', 'alpha', 'beta', 'kappa', 'w', 'phi']
+
+    def __init__(self, filename=frozen_graph_path, xla=False, session_options=None):
+        # imported here so that the numpy backend of Hand never imports tensorflow
+        import tensorflow as tf
+        import tensorflow.compat.v1 as tfcompat
+        from handwriting_synthesis.tf.utils import session_config
+        tfcompat.disable_v2_behavior()
+
+        graph_def = tfcompat.GraphDef()
+        with open(filename, 'rb') as f:
+            graph_def.ParseFromString(f.read())
+
+        with tf.Graph().as_default() as self.graph:
+            tfcompat.import_graph_def(graph_def, name='')
+
+        for name in self.input_names + self.output_names:
+            setattr(self, name, self.graph.get_tensor_by_name('{}:0'.format(name)))
+        self.primed_state = tuple(
+            self.graph.get_tensor_by_name('primed_state_{}:0'.format(field)) for field in self.state_fields)
+        self.chunk_final_state = tuple(
+            self.graph.get_tensor_by_name('chunk_final_state_{}:0'.format(field)) for field in self.state_fields)
+        # fields of the initial state which sampling does not read are pruned when freezing
+        operation_names = {operation.name for operation in self.graph.get_operations()}
+        self.sample_initial_state = tuple(
+            self.graph.get_tensor_by_name('initial_state_{}:0'.format(field))
+            if 'initial_state_{}'.format(field) in operation_names else None
+            for field in self.state_fields
+        )
+        self.session = tfcompat.Session(graph=self.graph, config=session_config(xla=xla, **(session_options or {})))
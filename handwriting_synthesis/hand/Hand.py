@@ -5,39 +5,136 @@ import numpy as np
 
 from handwriting_synthesis import drawing
 from handwriting_synthesis.config import prediction_path, checkpoint_path, style_path
-from handwriting_synthesis.hand._draw import _draw
-from handwriting_synthesis.rnn import RNN
+from handwriting_synthesis.hand.FrozenRNN import FrozenRNN
+from handwriting_synthesis.hand.NumpyRNN import NumpyRNN
+from handwriting_synthesis.hand._attention import _window
+from handwriting_synthesis.hand._draw import _document, _draw
+from handwriting_synthesis.hand._raster import _png, _raster, _stroke_styles
+from handwriting_synthesis.hand._schedule import _bucket, _schedule
+from handwriting_synthesis.hand._session import _session_options
 
 
 class Hand(object):
-    def __init__(self):
+    def __init__(self, frozen_graph=None, max_batch_size=64, max_padding=None, cache_styles=False,
+                 backend='tensorflow', attention_band=None, xla=False, session_options=None, state_sampling=None):
+        """
+        Args:
+            frozen_graph: Path to a graph written by handwriting_synthesis.hand.export.  If None, the
+                model is rebuilt and restored from the checkpoint.  Only used by the tensorflow backend.
+            max_batch_size: Maximum number of lines sampled in one batch.
+            max_padding: Lines are batched with others of similar length (in sampling timesteps).  If set,
+                the longest line of a batch is at most (1 + max_padding) times as long as the shortest.
+                Finished lines stop being sampled within a batch, so splitting a request into more
+                batches mostly pays off when priming/attention padding dominates.
+            cache_styles: If true, the state after priming with a style is computed once and reused for
+                every line written in that style, rather than priming again for each line.  The cached state
+                is primed without the line's text, so the samples differ somewhat from fully primed ones
+                (see benchmarks/style_cache.py); off by default.
+            backend: 'tensorflow', or 'numpy' to sample with NumpyRNN, which reads the checkpoint weights
+                and never imports tensorflow.
+            attention_band: If set, the attention window is only evaluated over this many characters around
+                the current attention position instead of over the whole text (including the priming text
+                when priming), so its cost does not grow with the text length.  A frozen graph keeps the
+                setting it was exported with.
+            xla: If true, the tensorflow backend compiles the sampling graph with XLA.  Every new input shape
+                is compiled separately, so the number of characters of a batch is padded to a power of two,
+                and finished lines are not removed from the batch while sampling (which would change its
+                shape at every step where a line finishes).
+            session_options: Options of the tensorflow session: a dict of keyword arguments of
+                handwriting_synthesis.tf.utils.session_config (e.g. intra_op_threads), or the filename of a
+                profile written by handwriting_synthesis.hand.autotune.
+            state_sampling: If true, the tensorflow graph also gets the ops which prime and sample from a
+                given state and sample in chunks, which cache_styles and stream need.  By default they are
+                only built if cache_styles is true.  The numpy backend and exported frozen graphs always
+                have them.
+        """
+        if backend not in ('tensorflow', 'numpy'):
+            raise ValueError("backend must be 'tensorflow' or 'numpy', got {!r}".format(backend))
+
         os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
-        self.nn = RNN(
-            log_dir='logs',
-            checkpoint_dir=checkpoint_path,
-            prediction_dir=prediction_path,
-            learning_rates=[.0001, .00005, .00002],
-            batch_sizes=[32, 64, 64],
-            patiences=[1500, 1000, 500],
-            beta1_decays=[.9, .9, .9],
-            validation_batch_size=32,
-            optimizer='rms',
-            num_training_steps=100000,
-            warm_start_init_step=17900,
-            regularization_constant=0.0,
-            keep_prob=1.0,
-            enable_parameter_averaging=False,
-            min_steps_to_checkpoint=2000,
-            log_interval=20,
-            logging_level=logging.CRITICAL,
-            grad_clip=10,
-            lstm_size=400,
-            output_mixture_components=20,
-            attention_mixture_components=10
-        )
-        self.nn.restore()
-
-    def write(self, filename, lines, biases=None, styles=None, stroke_colors=None, stroke_widths=None):
+        self.max_batch_size = max_batch_size
+        self.max_padding = max_padding
+        self.cache_styles = cache_styles
+        self.xla = xla
+        self._style_states = {}
+        session_options = _session_options(session_options)
+        if backend == 'numpy':
+            self.nn = NumpyRNN(checkpoint_path, attention_band=attention_band)
+        elif frozen_graph is not None:
+            self.nn = FrozenRNN(frozen_graph, xla=xla, session_options=session_options)
+        else:
+            # imported here so that loading a frozen graph never builds or imports the graph code
+            from handwriting_synthesis.rnn import RNN
+            self.nn = RNN(
+                log_dir='logs',
+                checkpoint_dir=checkpoint_path,
+                prediction_dir=prediction_path,
+                learning_rates=[.0001, .00005, .00002],
+                batch_sizes=[32, 64, 64],
+                patiences=[1500, 1000, 500],
+                beta1_decays=[.9, .9, .9],
+                validation_batch_size=32,
+                optimizer='rms',
+                num_training_steps=100000,
+                warm_start_init_step=17900,
+                regularization_constant=0.0,
+                keep_prob=1.0,
+                enable_parameter_averaging=False,
+                min_steps_to_checkpoint=2000,
+                log_interval=20,
+                logging_level=logging.CRITICAL,
+                grad_clip=10,
+                lstm_size=400,
+                output_mixture_components=20,
+                attention_mixture_components=10,
+                compact_sampling=not xla,
+                attention_band=attention_band,
+                state_sampling=cache_styles if state_sampling is None else state_sampling,
+                inference_only=True,
+                xla=xla,
+                session_options=session_options
+            )
+            self.nn.restore()
+
+    def write(self, filename, lines, biases=None, styles=None, stroke_colors=None, stroke_widths=None,
+              precision=None, direct=False, simplify=None, relative=False):
+        """
+        Samples lines and draws them to an svg file.  filename can also be a file-like object (opened in
+        text or binary mode), e.g. a response stream.  precision, direct, simplify and relative are passed
+        on to _draw.
+        """
+        self._validate(lines)
+        strokes = self._sample(lines, biases=biases, styles=styles)
+        _draw(strokes, lines, filename, stroke_colors=stroke_colors, stroke_widths=stroke_widths,
+              precision=precision, direct=direct, simplify=simplify, relative=relative)
+
+    def svg(self, lines, biases=None, styles=None, stroke_colors=None, stroke_widths=None, precision=None,
+            direct=False, as_bytes=False, simplify=None, relative=False):
+        """
+        Samples lines and returns the svg document write would write, as a string or, if as_bytes is true,
+        as utf-8 encoded bytes.  Nothing is written to disk.
+        """
+        self._validate(lines)
+        strokes = self._sample(lines, biases=biases, styles=styles)
+        svg = _document(strokes, lines, stroke_colors=stroke_colors, stroke_widths=stroke_widths,
+                        precision=precision, direct=direct, simplify=simplify, relative=relative)
+        return svg.encode('utf-8') if as_bytes else svg
+
+    def png(self, lines, biases=None, styles=None, stroke_colors=None, stroke_widths=None, dpi=96):
+        """
+        Samples lines and returns the page write would draw as png bytes, rasterized with numpy at dpi pixels
+        per inch.  Stroke colors are basic css color names (those of _raster._named_colors) or #rgb/#rrggbb
+        hex colors, and stroke widths numbers or numeric strings; both are checked before sampling.
+        """
+        self._validate(lines)
+        # checked before sampling, which takes far longer than rastering
+        _stroke_styles(stroke_colors, stroke_widths, len(lines))
+        strokes = self._sample(lines, biases=biases, styles=styles)
+        image = _raster(strokes, lines, stroke_colors=stroke_colors, stroke_widths=stroke_widths, dpi=dpi)
+        return _png(image, dpi=dpi)
+
+    @staticmethod
+    def _validate(lines):
         valid_char_set = set(drawing.alphabet)
         for line_num, line in enumerate(lines):
             if len(line) > 75:
@@ -57,51 +154,207 @@ class Hand(object):
                         ).format(char, line_num, valid_char_set)
                     )
 
-        strokes = self._sample(lines, biases=biases, styles=styles)
-        _draw(strokes, lines, filename, stroke_colors=stroke_colors, stroke_widths=stroke_widths)
+    @staticmethod
+    def _validate_styles(styles):
+        for style in set(styles):
+            for suffix in ('strokes', 'chars'):
+                if not os.path.exists(f"{style_path}/style-{style}-{suffix}.npy"):
+                    raise ValueError("Style {} not found in {}".format(style, style_path))
 
-    def _sample(self, lines, biases=None, styles=None):
+    def stream(self, lines, biases=None, styles=None, chunk_size=20):
+        """
+        Samples lines like write, but yields the strokes while they are being sampled instead of once every
+        line is finished.  All lines are sampled as one batch, chunk_size timesteps at a time, and the
+        model state is carried over from one chunk to the next.  After each chunk, a list holding the new
+        stroke offsets of every line (an [n, 3] array, empty for lines which are already finished) is
+        yielded.  Concatenating the chunks of a line gives the same kind of sample as _sample.
+
+        Args:
+            lines: Lines of text to write.
+            biases: Sampling bias of each line.
+            styles: Style of each line, or None to sample unprimed.
+            chunk_size: Number of timesteps sampled per session run.  Smaller chunks yield the first
+                strokes sooner, at the cost of more session runs per line.
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive, got {}'.format(chunk_size))
+        if self.nn.sampled_chunk is None:
+            raise ValueError('streaming needs the chunked sampling graph, build the Hand with state_sampling=True')
+        self._validate(lines)
         num_samples = len(lines)
-        max_tsteps = 40 * max([len(i) for i in lines])
+        remaining = 40 * np.array([len(i) for i in lines])
         biases = biases if biases is not None else [0.5] * num_samples
+        x_primes, chars, states = self._prepare(lines, styles)
 
-        x_prime = np.zeros([num_samples, 1200, 3])
-        x_prime_len = np.zeros([num_samples])
-        chars = np.zeros([num_samples, 120])
-        chars_len = np.zeros([num_samples])
+        feed_dict = self._feed_dict(x_primes, chars, remaining, biases, prime=styles is not None)
+        if states is not None:
+            state = self._batch_state(states, feed_dict[self.nn.c].shape[1])
+        else:
+            # the zero state when there are no priming strokes
+            primed_state = self.nn.session.run(self.nn.primed_state, feed_dict=feed_dict)
+            state = dict(zip(self.nn.state_fields, primed_state))
+
+        # unprimed lines start from a pen up, primed ones from a sample of their primed state
+        initial_input = np.tile([[0.0, 0.0, 1.0]], [num_samples, 1]) if styles is None else None
+        active = remaining > 0
+        while np.any(active):
+            tsteps = np.where(active, np.minimum(remaining, chunk_size), 0)
+            feed_dict[self.nn.sample_tsteps] = tsteps
+            feed_dict.update(self._state_feed(state))
+            if initial_input is not None:
+                feed_dict[self.nn.chunk_initial_input] = initial_input
 
-        if styles is not None:
-            for i, (cs, style) in enumerate(zip(lines, styles)):
-                x_p = np.load(f"{style_path}/style-{style}-strokes.npy")
-                c_p = np.load(f"{style_path}/style-{style}-chars.npy").tostring().decode('utf-8')
+            chunk, *final_state = self.nn.session.run(
+                [self.nn.sampled_chunk] + list(self.nn.chunk_final_state), feed_dict=feed_dict)
+            steps = np.sum(np.any(chunk != 0.0, axis=2), axis=1)
+            if np.any(steps):
+                yield [chunk[i, :steps[i]] for i in range(num_samples)]
 
-                c_p = str(c_p) + " " + cs
-                c_p = drawing.encode_ascii(c_p)
-                c_p = np.array(c_p)
+            state = dict(zip(self.nn.state_fields, final_state))
+            if initial_input is None:
+                initial_input = np.zeros([num_samples, 3])
+            sampled = np.flatnonzero(steps)
+            initial_input[sampled] = chunk[sampled, steps[sampled] - 1]
+            remaining = remaining - steps
+            # a line which stopped before the end of its chunk has terminated
+            active &= (steps == tsteps) & (remaining > 0)
 
-                x_prime[i, :len(x_p), :] = x_p
-                x_prime_len[i] = len(x_p)
-                chars[i, :len(c_p)] = c_p
-                chars_len[i] = len(c_p)
+    def _prepare(self, lines, styles):
+        x_primes = []
+        chars = []
+        states = None
+        if styles is not None and self.cache_styles:
+            states = []
+            for cs, style in zip(lines, styles):
+                x_primes.append(np.zeros([0, 3]))
+                chars.append(drawing.encode_ascii(cs))
+                states.append(self._style_state(style))
+
+        elif styles is not None:
+            for cs, style in zip(lines, styles):
+                x_p, c_p = self._load_style(style)
+
+                c_p = c_p + " " + cs
+                x_primes.append(x_p)
+                chars.append(drawing.encode_ascii(c_p))
 
         else:
-            for i in range(num_samples):
-                encoded = drawing.encode_ascii(lines[i])
-                chars[i, :len(encoded)] = encoded
-                chars_len[i] = len(encoded)
-
-        [samples] = self.nn.session.run(
-            [self.nn.sampled_sequence],
-            feed_dict={
-                self.nn.prime: styles is not None,
-                self.nn.x_prime: x_prime,
-                self.nn.x_prime_len: x_prime_len,
-                self.nn.num_samples: num_samples,
-                self.nn.sample_tsteps: max_tsteps,
-                self.nn.c: chars,
-                self.nn.c_len: chars_len,
-                self.nn.bias: biases
-            }
-        )
+            for cs in lines:
+                x_primes.append(np.zeros([0, 3]))
+                chars.append(drawing.encode_ascii(cs))
+
+        return x_primes, chars, states
+
+    def _sample(self, lines, biases=None, styles=None):
+        num_samples = len(lines)
+        tsteps = 40 * np.array([len(i) for i in lines])
+        biases = biases if biases is not None else [0.5] * num_samples
+        x_primes, chars, states = self._prepare(lines, styles)
+
+        # priming and free running timesteps dominate the cost of a sample, so lines are batched
+        # with others of similar cost to limit the time spent on padding
+        costs = [len(x_p) + t for x_p, t in zip(x_primes, tsteps)]
+        samples = [np.zeros([0, 3]) for _ in lines]
+        sampled = np.flatnonzero(tsteps)
+        for batch in _schedule([costs[i] for i in sampled], self.max_batch_size, self.max_padding):
+            batch = sampled[batch]
+            batch_samples = self._sample_batch(
+                x_primes=[x_primes[i] for i in batch],
+                chars=[chars[i] for i in batch],
+                tsteps=tsteps[batch],
+                biases=[biases[i] for i in batch],
+                prime=styles is not None,
+                states=[states[i] for i in batch] if states is not None else None
+            )
+            for i, sample in zip(batch, batch_samples):
+                samples[i] = sample
+        return samples
+
+    def _sample_batch(self, x_primes, chars, tsteps, biases, prime, states=None):
+        feed_dict = self._feed_dict(x_primes, chars, tsteps, biases, prime)
+        sampled_sequence = self.nn.sampled_sequence
+        if states is not None:
+            feed_dict.update(self._state_feed(self._batch_state(states, feed_dict[self.nn.c].shape[1])))
+            sampled_sequence = self.nn.sampled_sequence_from_state
+
+        [samples] = self.nn.session.run([sampled_sequence], feed_dict=feed_dict)
         samples = [sample[~np.all(sample == 0.0, axis=1)] for sample in samples]
         return samples
+
+    def _feed_dict(self, x_primes, chars, tsteps, biases, prime):
+        num_samples = len(chars)
+
+        x_prime = np.zeros([num_samples, max([1] + [len(x_p) for x_p in x_primes]), 3])
+        x_prime_len = np.zeros([num_samples])
+        char_len = max(len(c_p) for c_p in chars)
+        c = np.zeros([num_samples, _bucket(char_len) if self.xla else char_len])
+        c_len = np.zeros([num_samples])
+
+        for i, (x_p, c_p) in enumerate(zip(x_primes, chars)):
+            x_prime[i, :len(x_p), :] = x_p
+            x_prime_len[i] = len(x_p)
+            c[i, :len(c_p)] = c_p
+            c_len[i] = len(c_p)
+
+        return {
+            self.nn.prime: prime,
+            self.nn.x_prime: x_prime,
+            self.nn.x_prime_len: x_prime_len,
+            self.nn.num_samples: num_samples,
+            self.nn.sample_tsteps: tsteps,
+            self.nn.c: c,
+            self.nn.c_len: c_len,
+            self.nn.bias: biases
+        }
+
+    @staticmethod
+    def _batch_state(states, char_len):
+        """
+        Stacks cached style states into the state of a batch, with phi computed over its char_len characters
+        """
+        state = {field: np.concatenate([s[field] for s in states]) for field in states[0]}
+        state['phi'] = _window(state['alpha'], state['beta'], state['kappa'], char_len)
+        return state
+
+    def _state_feed(self, state):
+        # fields of the initial state which a frozen graph does not read have no placeholder
+        return {
+            placeholder: state[field]
+            for placeholder, field in zip(self.nn.sample_initial_state, self.nn.state_fields)
+            if placeholder is not None
+        }
+
+    @staticmethod
+    def _load_style(style):
+        x_p = np.load(f"{style_path}/style-{style}-strokes.npy")
+        c_p = np.load(f"{style_path}/style-{style}-chars.npy").tostring().decode('utf-8')
+        return x_p, str(c_p)
+
+    def _style_state(self, style):
+        """
+        Model state after priming with a style, computed once per style (priming does not depend on the
+        bias).  The priming text is followed by a space, and kappa is re-based so that the attention
+        window continues from the start of whichever line is then sampled from this state.
+        """
+        if style not in self._style_states:
+            x_p, c_p = self._load_style(style)
+            chars = drawing.encode_ascii(c_p + " ")
+            primed_state = self.nn.session.run(
+                self.nn.primed_state,
+                feed_dict={
+                    self.nn.x_prime: x_p[np.newaxis],
+                    self.nn.x_prime_len: [len(x_p)],
+                    self.nn.num_samples: 1,
+                    self.nn.c: chars[np.newaxis],
+                    self.nn.c_len: [len(chars)],
+                }
+            )
+            # phi covers the priming text, it is recomputed over each batch's characters when sampling
+            state = {
+                field: value for field, value in zip(self.nn.state_fields, primed_state) if field != 'phi'
+            }
+            # chars ends with the terminating null character, which the sampled line brings along
+            state['kappa'] = state['kappa'] - (len(chars) - 1)
+            self._style_states[style] = state
+        return self._style_states[style]
+
@@ -0,0 +1,221 @@
+import itertools
+import math
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+from handwriting_synthesis.hand.Hand import Hand
+from handwriting_synthesis.hand._draw import _draw
+from handwriting_synthesis.hand._schedule import _shard
+from handwriting_synthesis.hand._session import _session_options
+
+
+class HandPool(object):
+    """
+    Samples lines on several worker processes, each with its own Hand (and so its own restored model and
+    tensorflow session), to make use of more cores than a single session does.
+
+    The lines of a request are split into shards of similar sampling cost, one per worker (but at least
+    min_shard_size lines each), which are queued for whichever worker is free.  The strokes are put back
+    in the order of the lines once every shard is sampled.  Requests of concurrent callers are queued
+    together.  Workers are started with the spawn method, since tensorflow does not survive a fork.
+
+    Args:
+        num_workers: Number of worker processes, by default one per core.
+        intra_op_threads: Intra-op threads of each worker's session, by default those of
+            hand_kwargs['session_options'] or else the cores divided between the workers.
+        inter_op_threads: Inter-op threads of each worker's session, by default those of
+            hand_kwargs['session_options'] or else the same as intra_op_threads.
+        cpu_affinity: If true, each worker is pinned to its own intra_op_threads cores (Linux only).
+        min_shard_size: Minimum number of lines sampled by one worker for a request.
+        hand_kwargs: Passed on to each worker's Hand.
+    """
+
+    def __init__(self, num_workers=None, intra_op_threads=None, inter_op_threads=None, cpu_affinity=False,
+                 min_shard_size=4, **hand_kwargs):
+        num_cores = os.cpu_count() or 1
+        self.num_workers = num_workers or num_cores
+        session_options = _session_options(hand_kwargs.pop('session_options', None))
+        self.intra_op_threads = (
+            intra_op_threads or session_options.get('intra_op_threads') or max(1, num_cores // self.num_workers))
+        self.inter_op_threads = (
+            inter_op_threads or session_options.get('inter_op_threads') or self.intra_op_threads)
+        self.min_shard_size = min_shard_size
+        if cpu_affinity and not hasattr(os, 'sched_setaffinity'):
+            raise ValueError('cpu_affinity is not supported on this platform')
+
+        context = multiprocessing.get_context('spawn')
+        self._requests = context.Queue()
+        self._results = context.Queue()
+        hand_kwargs['session_options'] = dict(
+            session_options, intra_op_threads=self.intra_op_threads, inter_op_threads=self.inter_op_threads)
+        self._workers = []
+        for index in range(self.num_workers):
+            cores = None
+            if cpu_affinity:
+                first = index * self.intra_op_threads
+                cores = [core % num_cores for core in range(first, first + self.intra_op_threads)]
+            worker = context.Process(
+                target=_work, args=(hand_kwargs, cores, self._requests, self._results),
+                name='HandPool-{}'.format(index), daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        # wait until every model is loaded, so that a worker which fails to start raises here
+        num_ready = 0
+        while num_ready < self.num_workers:
+            try:
+                error = self._results.get(timeout=1)
+            except queue.Empty:
+                if any(worker.exitcode is not None for worker in self._workers):
+                    error = RuntimeError('a HandPool worker exited while starting')
+                else:
+                    continue
+            if error is not None:
+                self._terminate()
+                raise error
+            num_ready += 1
+
+        self._jobs = {}
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._collector = threading.Thread(target=self._collect, name='HandPool', daemon=True)
+        self._collector.start()
+
+    def submit(self, lines, biases=None, styles=None):
+        """Queues lines for sampling and returns a concurrent.futures.Future of their strokes"""
+        if self._closed:
+            raise RuntimeError('HandPool is closed')
+        lines = list(lines)
+        Hand._validate(lines)
+        biases = list(biases) if biases is not None else [0.5] * len(lines)
+        styles = list(styles) if styles is not None else None
+        # checked before the job is registered, which a shard failing to index them would leave behind
+        if len(biases) != len(lines):
+            raise ValueError('got {} biases for {} lines'.format(len(biases), len(lines)))
+        if styles is not None:
+            if len(styles) != len(lines):
+                raise ValueError('got {} styles for {} lines'.format(len(styles), len(lines)))
+            Hand._validate_styles(styles)
+
+        future = Future()
+        if not lines:
+            future.set_result([])
+            return future
+
+        costs = [len(line) for line in lines]
+        num_shards = min(max(len(self._workers), 1), math.ceil(len(lines) / self.min_shard_size))
+        shards = _shard(costs, num_shards)
+
+        job_id = next(self._job_ids)
+        with self._lock:
+            self._jobs[job_id] = (future, shards, [None] * len(lines), [len(shards)])
+        future.set_running_or_notify_cancel()
+        for shard_id, shard in enumerate(shards):
+            self._requests.put((
+                job_id,
+                shard_id,
+                [lines[i] for i in shard],
+                [biases[i] for i in shard],
+                [styles[i] for i in shard] if styles is not None else None
+            ))
+        return future
+
+    def sample(self, lines, biases=None, styles=None):
+        return self.submit(lines, biases=biases, styles=styles).result()
+
+    def write(self, filename, lines, biases=None, styles=None, stroke_colors=None, stroke_widths=None):
+        strokes = self.sample(lines, biases=biases, styles=styles)
+        _draw(strokes, lines, filename, stroke_colors=stroke_colors, stroke_widths=stroke_widths)
+
+    def close(self):
+        """Samples the requests which are already queued, then stops the workers"""
+        self._closed = True
+        for _ in self._workers:
+            self._requests.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._results.put(None)
+        self._collector.join()
+
+    def _terminate(self):
+        self._closed = True
+        for worker in self._workers:
+            worker.terminate()
+            worker.join()
+
+    def _collect(self):
+        while True:
+            try:
+                result = self._results.get(timeout=1)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if result is None:
+                break
+
+            job_id, shard_id, strokes = result
+            with self._lock:
+                # the other shards of a request which failed are dropped
+                if job_id not in self._jobs:
+                    continue
+                future, shards, samples, remaining = self._jobs[job_id]
+                if isinstance(strokes, Exception):
+                    del self._jobs[job_id]
+                    if not future.done():
+                        future.set_exception(strokes)
+                    continue
+
+                for i, sample in zip(shards[shard_id], strokes):
+                    samples[i] = sample
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    del self._jobs[job_id]
+                    future.set_result(samples)
+
+    def _check_workers(self):
+        """
+        Fails every pending request if a worker has died (e.g. was killed for running out of memory), since
+        the shards it was sampling will never come back.  The other workers keep serving new requests.
+        """
+        # workers exit by themselves only once the pool is closed and every queued shard is sampled
+        dead = [worker for worker in self._workers
+                if worker.exitcode is not None and (worker.exitcode != 0 or not self._closed)]
+        if not dead:
+            return
+
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker not in dead]
+            if not self._workers:
+                self._closed = True
+            jobs, self._jobs = self._jobs, {}
+        error = RuntimeError('HandPool worker {} exited with code {}'.format(dead[0].name, dead[0].exitcode))
+        for future, _, _, _ in jobs.values():
+            if not future.done():
+                future.set_exception(error)
+
+
+def _work(hand_kwargs, cores, requests, results):
+    try:
+        if cores is not None:
+            os.sched_setaffinity(0, cores)
+        hand = Hand(**hand_kwargs)
+    except Exception as error:
+        results.put(error)
+        return
+    results.put(None)
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+
+        job_id, shard_id, lines, biases, styles = request
+        try:
+            strokes = hand._sample(lines, biases=biases, styles=styles)
+        except Exception as error:
+            strokes = error
+        results.put((job_id, shard_id, strokes))
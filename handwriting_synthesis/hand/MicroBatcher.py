@@ -0,0 +1,142 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from handwriting_synthesis.hand._draw import _draw
+
+
+class MicroBatcher(object):
+    """
+    Coalesces the lines of concurrent callers into shared sampling batches for one Hand.
+
+    Requests are queued and picked up by a single worker thread, which is the only thread running the
+    Hand's session.  The worker waits at most max_wait seconds after the first queued request for more
+    requests to arrive, or until max_batch_size lines are collected, then samples all of them together
+    and hands each caller back its own strokes.  Requests with and without styles are sampled in
+    separate batches, since priming is switched on or off for a whole batch.
+
+    Args:
+        hand: handwriting_synthesis.hand.Hand used for sampling.
+        max_batch_size: Number of lines after which a batch is sampled without waiting any longer.
+            A single request with more lines is sampled on its own.
+        max_wait: Maximum time in seconds a request waits for others to batch with.
+    """
+
+    def __init__(self, hand, max_batch_size=64, max_wait=0.01):
+        self.hand = hand
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name='MicroBatcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, lines, biases=None, styles=None):
+        """Queues lines for sampling and returns a concurrent.futures.Future of their strokes"""
+        if self._closed:
+            raise RuntimeError('MicroBatcher is closed')
+        lines = list(lines)
+        self.hand._validate(lines)
+        biases = list(biases) if biases is not None else [0.5] * len(lines)
+        styles = list(styles) if styles is not None else None
+        # the lines of a batch are sampled with the biases and styles of all of its requests laid end to end
+        if len(biases) != len(lines):
+            raise ValueError('got {} biases for {} lines'.format(len(biases), len(lines)))
+        if styles is not None and len(styles) != len(lines):
+            raise ValueError('got {} styles for {} lines'.format(len(styles), len(lines)))
+        if styles is not None:
+            # so that a missing style file fails this request alone, not the batch it would be sampled in
+            self.hand._validate_styles(styles)
+
+        future = Future()
+        if not lines:
+            future.set_result([])
+            return future
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('MicroBatcher is closed')
+            self._queue.put((lines, biases, styles, future))
+        return future
+
+    def sample(self, lines, biases=None, styles=None):
+        return self.submit(lines, biases=biases, styles=styles).result()
+
+    def write(self, filename, lines, biases=None, styles=None, stroke_colors=None, stroke_widths=None):
+        strokes = self.sample(lines, biases=biases, styles=styles)
+        _draw(strokes, lines, filename, stroke_colors=stroke_colors, stroke_widths=stroke_widths)
+
+    def close(self):
+        """Samples the requests which are already queued, then stops the worker thread"""
+        with self._lock:
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join()
+
+        # requests left behind the worker are failed rather than left waiting forever
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None and request[3].set_running_or_notify_cancel():
+                request[3].set_exception(RuntimeError('MicroBatcher is closed'))
+
+    def _run(self):
+        closing = False
+        while not closing:
+            request = self._queue.get()
+            if request is None:
+                break
+
+            requests = [request]
+            num_lines = len(request[0])
+            deadline = time.time() + self.max_wait
+            while num_lines < self.max_batch_size:
+                try:
+                    request = self._queue.get(timeout=max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    closing = True
+                    break
+                requests.append(request)
+                num_lines += len(request[0])
+
+            for primed in (False, True):
+                batch = [request for request in requests if (request[2] is not None) == primed]
+                if batch:
+                    self._sample(batch, primed)
+
+    def _sample(self, requests, primed):
+        # requests whose futures were cancelled while queued are dropped
+        requests = [request for request in requests if request[3].set_running_or_notify_cancel()]
+        if not requests:
+            return
+
+        lines, biases, styles = [], [], []
+        for request_lines, request_biases, request_styles, _ in requests:
+            lines.extend(request_lines)
+            biases.extend(request_biases)
+            styles.extend(request_styles or [])
+
+        try:
+            strokes = self.hand._sample(lines, biases=biases, styles=styles if primed else None)
+        except Exception as error:
+            if len(requests) == 1:
+                requests[0][3].set_exception(error)
+                return
+            # each request is sampled on its own, so that only the one which failed the batch gets the error
+            for request_lines, request_biases, request_styles, future in requests:
+                try:
+                    future.set_result(self.hand._sample(request_lines, biases=request_biases, styles=request_styles))
+                except Exception as request_error:
+                    future.set_exception(request_error)
+            return
+
+        start = 0
+        for request_lines, _, _, future in requests:
+            future.set_result(strokes[start:start + len(request_lines)])
+            start += len(request_lines)
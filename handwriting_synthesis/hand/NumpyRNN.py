@@ -0,0 +1,272 @@
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from handwriting_synthesis import drawing
+from handwriting_synthesis.hand._attention import _banded_window, _window
+from handwriting_synthesis.hand._checkpoint import _latest_checkpoint, _load_checkpoint
+
+NumpyCellState = namedtuple(
+    'NumpyCellState',
+    ['h1', 'c1', 'h2', 'c2', 'h3', 'c3', 'alpha', 'beta', 'kappa', 'w', 'phi']
+)
+
+
+class NumpyRNN(object):
+    """
+    Sampling engine computing LSTMAttentionCell and its output function with numpy over the batch, using
+    weights read straight from a checkpoint.  Neither tensorflow nor the graph code is imported.
+
+    Exposes the same placeholders, outputs and session attributes as RNN and FrozenRNN, so Hand can use
+    any of them.  Placeholders and outputs are plain names here, and session.run evaluates the fetched
+    names given a feed dict keyed by placeholder names.
+
+    Args:
+        checkpoint: Checkpoint prefix (e.g. model/checkpoint/model-17900) or a directory, in which case
+            its most recent checkpoint is used, or a dict of the checkpoint's tensors by name.
+        seed: Seed of the random generator used for sampling.
+        attention_band: If set, the attention window is only evaluated over this many characters around
+            the current attention position, like LSTMAttentionCell(attention_band=...).
+    """
+    input_names = [
+        'c', 'c_len', 'sample_tsteps', 'num_samples', 'prime', 'x_prime', 'x_prime_len', 'bias', 'chunk_initial_input'
+    ]
+    output_names = ['sampled_sequence', 'sampled_sequence_from_state', 'sampled_chunk']
+    state_fields = list(NumpyCellState._fields)
+
+    def __init__(self, checkpoint, seed=None, attention_band=None):
+        if isinstance(checkpoint, dict):
+            weights = checkpoint
+        else:
+            if os.path.isdir(checkpoint):
+                checkpoint = _latest_checkpoint(checkpoint)
+            weights = _load_checkpoint(checkpoint)
+        scope = 'rnn/LSTMAttentionCell/'
+        lstm_scopes = [scope + name for name in ('lstm_cell', 'lstm_cell_1', 'lstm_cell_2')]
+        self.lstm_kernels = [weights[lstm_scope + '/kernel'] for lstm_scope in lstm_scopes]
+        self.lstm_biases = [weights[lstm_scope + '/bias'] for lstm_scope in lstm_scopes]
+        self.attention_weights = weights[scope + 'attention/weights']
+        self.attention_biases = weights[scope + 'attention/biases']
+        self.gmm_weights = weights['rnn/gmm/weights']
+        self.gmm_biases = weights['rnn/gmm/biases']
+
+        self.lstm_size = self.gmm_weights.shape[0]
+        self.num_attn_mixture_components = self.attention_biases.shape[0] // 3
+        self.num_output_mixture_components = (self.gmm_biases.shape[0] - 1) // 6
+        self.window_size = len(drawing.alphabet)
+        self.rng = np.random.default_rng(seed)
+        self.attention_band = attention_band
+
+        for name in self.input_names + self.output_names:
+            setattr(self, name, name)
+        self.primed_state = tuple('primed_state_{}'.format(field) for field in self.state_fields)
+        self.sample_initial_state = tuple('initial_state_{}'.format(field) for field in self.state_fields)
+        self.chunk_final_state = tuple('chunk_final_state_{}'.format(field) for field in self.state_fields)
+        self.session = self
+
+    def run(self, fetches, feed_dict):
+        """
+        Evaluates the names in fetches (a list or tuple) from the inputs in feed_dict
+        """
+        inputs = {name: np.asarray(value) for name, value in feed_dict.items()}
+        c = inputs['c'].astype(np.int32)
+        c_len = inputs['c_len'].astype(np.int32)
+        num_samples = int(inputs['num_samples'])
+        bias = inputs.get('bias', np.zeros([num_samples])).astype(np.float32)
+        attention_values = np.eye(self.window_size, dtype=np.float32)[c]
+        attention_values *= (np.arange(c.shape[1]) < c_len[:, np.newaxis])[:, :, np.newaxis]
+
+        results = {}
+        if any(name in self.primed_state for name in fetches) or (
+                'sampled_sequence' in fetches and inputs['prime']):
+            primed_state = self.prime_state(
+                inputs['x_prime'].astype(np.float32), inputs['x_prime_len'], attention_values)
+            results.update(zip(self.primed_state, primed_state))
+
+        if 'sampled_sequence' in fetches:
+            if inputs['prime']:
+                initial_state, initial_input = primed_state, None
+            else:
+                initial_state = self.zero_state(num_samples, c.shape[1])
+                initial_input = np.tile(np.array([[0, 0, 1]], dtype=np.float32), (num_samples, 1))
+            results['sampled_sequence'] = self.free_run(
+                initial_state, inputs['sample_tsteps'], attention_values, c_len, bias, initial_input)
+
+        if 'sampled_sequence_from_state' in fetches or any(name in self.chunk_final_state for name in fetches):
+            initial_state = NumpyCellState(*[
+                inputs[name].astype(np.float32) if name in inputs else None for name in self.sample_initial_state
+            ])
+
+        if 'sampled_sequence_from_state' in fetches:
+            results['sampled_sequence_from_state'] = self.free_run(
+                initial_state, inputs['sample_tsteps'], attention_values, c_len, bias)
+
+        if 'sampled_chunk' in fetches or any(name in self.chunk_final_state for name in fetches):
+            initial_input = inputs.get('chunk_initial_input')
+            if initial_input is not None:
+                initial_input = initial_input.astype(np.float32)
+            sampled_chunk, final_state = self.free_run(
+                initial_state, inputs['sample_tsteps'], attention_values, c_len, bias, initial_input,
+                return_state=True)
+            results['sampled_chunk'] = sampled_chunk
+            results.update(zip(self.chunk_final_state, final_state))
+
+        return [results[name] for name in fetches]
+
+    def zero_state(self, batch_size, char_len):
+        return NumpyCellState(
+            *[np.zeros([batch_size, self.lstm_size], dtype=np.float32) for _ in range(6)],
+            *[np.zeros([batch_size, self.num_attn_mixture_components], dtype=np.float32) for _ in range(3)],
+            np.zeros([batch_size, self.window_size], dtype=np.float32),
+            np.zeros([batch_size, char_len], dtype=np.float32),
+        )
+
+    def cell(self, inputs, state, attention_values):
+        """
+        One step of LSTMAttentionCell.  attention_values holds the one-hot characters with padding
+        already masked out.
+        """
+        h1, c1 = _lstm(np.concatenate([state.w, inputs, state.h1], axis=1), state.c1,
+                       self.lstm_kernels[0], self.lstm_biases[0])
+
+        attention_inputs = np.concatenate([state.w, inputs, h1], axis=1)
+        attention_params = _softplus(attention_inputs @ self.attention_weights + self.attention_biases)
+        alpha, beta, kappa = np.split(attention_params, 3, axis=1)
+        kappa = state.kappa + kappa / 25.0
+        beta = np.maximum(beta, .01)
+        if self.attention_band is not None:
+            w, phi = _banded_window(alpha, beta, kappa, attention_values, self.attention_band)
+        else:
+            phi = _window(alpha, beta, kappa, attention_values.shape[1])
+            w = np.einsum('bu,buv->bv', phi, attention_values)
+
+        h2, c2 = _lstm(np.concatenate([inputs, h1, w, state.h2], axis=1), state.c2,
+                       self.lstm_kernels[1], self.lstm_biases[1])
+        h3, c3 = _lstm(np.concatenate([inputs, h2, w, state.h3], axis=1), state.c3,
+                       self.lstm_kernels[2], self.lstm_biases[2])
+        return NumpyCellState(h1, c1, h2, c2, h3, c3, alpha, beta, kappa, w, phi)
+
+    def prime_state(self, x_prime, x_prime_len, attention_values):
+        """
+        State after running the cell over each sample's priming strokes, like tf.nn.dynamic_rnn
+        """
+        state = self.zero_state(len(x_prime), attention_values.shape[1])
+        for t in range(int(np.max(x_prime_len, initial=0))):
+            active = np.flatnonzero(x_prime_len > t)
+            next_state = self.cell(
+                x_prime[active, t], _gather(state, active), attention_values[active])
+            for value, next_value in zip(state, next_state):
+                value[active] = next_value
+        return state
+
+    def parse_parameters(self, state, bias):
+        """
+        Mixture weights, means, standard deviations and correlations and the end of stroke probability of
+        the output distribution of state, as computed by LSTMAttentionCell._parse_parameters
+        """
+        params = state.h3 @ self.gmm_weights + self.gmm_biases
+        pis, sigmas, rhos, mus, es = np.split(
+            params, np.cumsum([1, 2, 1, 2]) * self.num_output_mixture_components, axis=1)
+        bias = bias[:, np.newaxis]
+
+        pis = _softmax(pis * (1 + bias))
+        pis[pis < .01] = 0
+        sigmas = np.maximum(np.exp(sigmas - bias), 1e-4)
+        rhos = np.clip(np.tanh(rhos), 1e-8 - 1.0, 1.0 - 1e-8)
+        es = np.clip(_sigmoid(es[:, 0]), 1e-8, 1.0 - 1e-8)
+        es[es < .01] = 0
+        return pis, mus, sigmas, rhos, es
+
+    def output_function(self, state, bias):
+        pis, mus, sigmas, rhos, es = self.parse_parameters(state, bias)
+
+        # same sampling scheme as LSTMAttentionCell.output_function
+        batch_size = len(pis)
+        cumulative = np.cumsum(pis, axis=1)
+        u = self.rng.random([batch_size, 1], dtype=np.float32) * cumulative[:, -1:]
+        idx = np.minimum(np.sum(cumulative <= u, axis=1), pis.shape[1] - 1)
+        rows = np.arange(batch_size)
+        k = self.num_output_mixture_components
+        mu1, mu2 = mus[rows, idx], mus[rows, k + idx]
+        sigma1, sigma2 = sigmas[rows, idx], sigmas[rows, k + idx]
+        rho = rhos[rows, idx]
+
+        z1, z2 = self.rng.standard_normal([2, batch_size], dtype=np.float32)
+        x1 = mu1 + sigma1 * z1
+        x2 = mu2 + sigma2 * (rho * z1 + np.sqrt(1.0 - np.square(rho)) * z2)
+        sampled_e = (self.rng.random(batch_size, dtype=np.float32) < es).astype(np.float32)
+        return np.stack([x1, x2, sampled_e], axis=1)
+
+    @staticmethod
+    def termination_condition(state, output, c_len):
+        char_idx = np.argmax(state.phi, axis=1)
+        final_char = char_idx >= c_len - 1
+        past_final_char = char_idx >= c_len
+        return (final_char & (output[:, 2] == 1)) | past_final_char
+
+    def free_run(self, initial_state, sequence_length, attention_values, c_len, bias, initial_input=None,
+                 return_state=False):
+        """
+        Samples like rnn_free_run with compact=True: every step draws one output per sequence, which is
+        emitted and fed back, and finished sequences are dropped from the working batch.  Returns the
+        outputs as a [batch_size, timesteps, 3] array, zero padded after each sequence finishes.  If
+        return_state is true, the state each sequence finished in is returned as well.
+        """
+        batch_size = len(attention_values)
+        sequence_length = np.broadcast_to(sequence_length, [batch_size])
+        if initial_input is None:
+            initial_input = self.output_function(initial_state, bias)
+
+        finished = (sequence_length <= 0) | self.termination_condition(initial_state, initial_input, c_len)
+        active = np.flatnonzero(~finished)
+        state = _gather(initial_state, active)
+        inputs = initial_input[active]
+        final_state = NumpyCellState(*[value.copy() if value is not None else None for value in initial_state])
+
+        outputs = []
+        while len(active):
+            state = self.cell(inputs, state, attention_values[active])
+            inputs = self.output_function(state, bias[active])
+            output = np.zeros([batch_size, 3], dtype=np.float32)
+            output[active] = inputs
+            outputs.append(output)
+
+            finished = (len(outputs) >= sequence_length[active]) | \
+                self.termination_condition(state, inputs, c_len[active])
+            if return_state:
+                for value, finished_value in zip(final_state, _gather(state, np.flatnonzero(finished))):
+                    if value is not None:
+                        value[active[finished]] = finished_value
+            keep = np.flatnonzero(~finished)
+            active, inputs, state = active[keep], inputs[keep], _gather(state, keep)
+
+        outputs = np.stack(outputs, axis=1) if outputs else np.zeros([batch_size, 0, 3], dtype=np.float32)
+        if return_state:
+            return outputs, final_state
+        return outputs
+
+
+def _gather(state, indices):
+    return NumpyCellState(*[value[indices] if value is not None else None for value in state])
+
+
+def _lstm(inputs, c, kernel, bias):
+    # tf.nn.rnn_cell.LSTMCell with gates ordered i, j, f, o and a forget bias of 1
+    i, j, f, o = np.split(inputs @ kernel + bias, 4, axis=1)
+    c = _sigmoid(f + 1.0) * c + _sigmoid(i) * np.tanh(j)
+    h = _sigmoid(o) * np.tanh(c)
+    return h, c
+
+
+def _sigmoid(x):
+    return .5 * np.tanh(.5 * x) + .5
+
+
+def _softplus(x):
+    return np.logaddexp(0, x)
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
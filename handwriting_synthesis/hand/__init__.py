@@ -1 +1,8 @@
+from .AsyncHand import AsyncHand
+from .FrozenRNN import FrozenRNN
 from .Hand import Hand
+from .HandPool import HandPool
+from .MicroBatcher import MicroBatcher
+from .NumpyRNN import NumpyRNN
+from .autotune import autotune
+from .export import export
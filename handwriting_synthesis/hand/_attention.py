@@ -0,0 +1,36 @@
+import numpy as np
+
+
+def _window(alpha, beta, kappa, char_len):
+    """
+    attention window weights phi over char_len characters, as computed by LSTMAttentionCell
+    """
+    u = np.arange(char_len, dtype=np.float32).reshape(1, 1, -1)
+    phi = alpha[:, :, np.newaxis] * np.exp(-np.square(kappa[:, :, np.newaxis] - u) / beta[:, :, np.newaxis])
+    return phi.sum(axis=1).astype(np.float32)
+
+
+def _banded_window(alpha, beta, kappa, attention_values, band):
+    """
+    w and phi of the attention window evaluated at band characters only, as computed by
+    LSTMAttentionCell._banded_window
+    """
+    batch_size, char_len = attention_values.shape[:2]
+    center = np.sum(alpha * kappa, axis=1) / np.maximum(np.sum(alpha, axis=1), 1e-8)
+    start = np.clip(np.floor(center).astype(np.int64) - band // 2, 0, max(char_len - band, 0))
+
+    positions = start[:, np.newaxis] + np.arange(band)
+    in_range = positions < char_len
+    positions = np.minimum(positions, char_len - 1)
+
+    u = positions[:, np.newaxis, :].astype(np.float32)
+    phi_band = np.sum(
+        alpha[:, :, np.newaxis] * np.exp(-np.square(kappa[:, :, np.newaxis] - u) / beta[:, :, np.newaxis]), axis=1)
+    phi_band *= in_range
+
+    values = np.take_along_axis(attention_values, positions[:, :, np.newaxis], axis=1)
+    w = np.einsum('bu,buv->bv', phi_band, values)
+
+    phi = np.zeros([batch_size, char_len], dtype=np.float32)
+    np.add.at(phi, (np.arange(batch_size)[:, np.newaxis], positions), phi_band)
+    return w, phi
@@ -0,0 +1,143 @@
+import os
+import struct
+
+import numpy as np
+
+# tensorflow DataType enum values of the numeric types stored by the checkpoint
+_dtypes = {
+    1: np.float32,
+    2: np.float64,
+    3: np.int32,
+    4: np.uint8,
+    5: np.int16,
+    6: np.int8,
+    9: np.int64,
+    10: np.bool_,
+}
+
+_table_magic = 0xdb4775248b80fb57
+_footer_size = 48
+
+
+def _load_checkpoint(prefix):
+    """
+    Reads the tensors of a tensorflow checkpoint (prefix is e.g. model/checkpoint/model-17900) into a
+    dict of name -> numpy array, without importing tensorflow.
+
+    The .index file of a checkpoint is an uncompressed leveldb table mapping each tensor name to a
+    serialized BundleEntryProto, which locates the tensor's bytes in one of the .data shards.  Tensors
+    of non-numeric types (e.g. the object graph strings) are skipped.
+    """
+    with open(prefix + '.index', 'rb') as f:
+        index = f.read()
+
+    entries = dict(_read_table(index))
+    num_shards = _parse_message(entries.pop(b''), {1}).get(1, 1)
+
+    tensors = {}
+    shards = {}
+    for name, entry in entries.items():
+        entry = _parse_message(entry, {1, 2, 3, 4, 5})
+        dtype = _dtypes.get(entry.get(1))
+        if dtype is None:
+            continue
+
+        dims = _parse_repeated(entry.get(2, b''), 2)
+        shape = [_parse_message(dim, {1}).get(1, 0) for dim in dims]
+
+        shard_id = entry.get(3, 0)
+        if shard_id not in shards:
+            shards[shard_id] = np.memmap(
+                '{}.data-{:05d}-of-{:05d}'.format(prefix, shard_id, num_shards), dtype=np.uint8, mode='r')
+        offset, size = entry.get(4, 0), entry.get(5, 0)
+        data = shards[shard_id][offset:offset + size]
+        tensors[name.decode('utf-8')] = np.frombuffer(data.tobytes(), dtype=dtype).reshape(shape)
+    return tensors
+
+
+def _read_table(data):
+    footer = data[-_footer_size:]
+    assert struct.unpack('<Q', footer[-8:])[0] == _table_magic, 'not a checkpoint index file'
+    _, pos = _read_varint(footer, 0)
+    _, pos = _read_varint(footer, pos)
+    index_offset, pos = _read_varint(footer, pos)
+    index_size, _ = _read_varint(footer, pos)
+
+    for _, handle in _read_block(data, index_offset, index_size):
+        offset, pos = _read_varint(handle, 0)
+        size, _ = _read_varint(handle, pos)
+        for key, value in _read_block(data, offset, size):
+            yield key, value
+
+
+def _read_block(data, offset, size):
+    # every block is followed by a one byte compression type and a crc
+    assert data[offset + size] == 0, 'compressed checkpoint index files are not supported'
+    block = data[offset:offset + size]
+    num_restarts = struct.unpack('<I', block[-4:])[0]
+    end = len(block) - 4 * (num_restarts + 1)
+
+    key = b''
+    pos = 0
+    while pos < end:
+        shared, pos = _read_varint(block, pos)
+        non_shared, pos = _read_varint(block, pos)
+        value_size, pos = _read_varint(block, pos)
+        key = key[:shared] + block[pos:pos + non_shared]
+        pos += non_shared
+        yield key, block[pos:pos + value_size]
+        pos += value_size
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return result, pos
+
+
+def _iter_fields(data):
+    pos = 0
+    while pos < len(data):
+        tag, pos = _read_varint(data, pos)
+        field, wire_type = tag >> 3, tag & 7
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+        elif wire_type == 1:
+            value, pos = data[pos:pos + 8], pos + 8
+        elif wire_type == 2:
+            size, pos = _read_varint(data, pos)
+            value, pos = data[pos:pos + size], pos + size
+        elif wire_type == 5:
+            value, pos = data[pos:pos + 4], pos + 4
+        else:
+            raise ValueError('unsupported protobuf wire type {}'.format(wire_type))
+        yield field, value
+
+
+def _parse_message(data, fields):
+    """
+    Returns the last value of each of the given (non-repeated) protobuf fields found in data
+    """
+    return {field: value for field, value in _iter_fields(data) if field in fields}
+
+
+def _parse_repeated(data, field):
+    return [value for f, value in _iter_fields(data) if f == field]
+
+
+def _latest_checkpoint(checkpoint_dir):
+    """
+    Prefix of the most recent checkpoint listed in checkpoint_dir/checkpoint, like tf.train.latest_checkpoint
+    """
+    with open(os.path.join(checkpoint_dir, 'checkpoint')) as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key.strip() == 'model_checkpoint_path':
+                return os.path.join(checkpoint_dir, value.strip().strip('"'))
+    raise ValueError('no checkpoint found in {}'.format(checkpoint_dir))
@@ -1,46 +1,165 @@
+import io
+import os
+from xml.sax.saxutils import escape
+
 import numpy as np
 import svgwrite
 
 from handwriting_synthesis import drawing
 
+_svg_header = (
+    '<?xml version="1.0" encoding="utf-8" ?>\n'
+    '<svg baseProfile="full" height="100%" version="1.1" viewBox="0,0,{width},{height}" width="100%" '
+    'xmlns="http://www.w3.org/2000/svg" xmlns:ev="http://www.w3.org/2001/xml-events" '
+    'xmlns:xlink="http://www.w3.org/1999/xlink"><defs />'
+    '<rect fill="white" height="{height}" width="{width}" x="0" y="0" />'
+)
+_svg_path = '<path d="{d}" fill="none" stroke="{color}" stroke-linecap="round" stroke-width="{width}" />'
+_svg_footer = '</svg>'
+
+# the characters ElementTree escapes in attribute values
+_attribute_entities = {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#09;'}
+
+
+def _draw(strokes, lines, filename, stroke_colors=None, stroke_widths=None, precision=None, direct=False,
+          simplify=None, relative=False):
+    """
+    Draws the strokes of each line as an svg document, which is written to filename.  filename can also
+    be a file-like object, opened in text or binary mode, or None, in which case the document is
+    returned as utf-8 encoded bytes.  Nothing but filename is written to.
+
+    Args:
+        precision: Number of decimals the coordinates are written with.  If None, each is written as the
+            shortest string which reads back as the same float.
+        direct: If true, the svg is written from string templates instead of being built with svgwrite's
+            object model.  The output is the same, but svgwrite does not validate the attribute values.
+        simplify: If given, the strokes are simplified with the Ramer-Douglas-Peucker algorithm, dropping
+            the points which are within this many svg units of the lines through the points kept.
+        relative: If true, the paths are written with relative commands, and with precision, trailing
+            zeros are dropped.  Together with precision and simplify, this makes the document several
+            times smaller.
+    """
+    svg = _document(strokes, lines, stroke_colors, stroke_widths, precision, direct, simplify, relative)
+    if filename is None:
+        return svg.encode('utf-8')
+    if isinstance(filename, (str, bytes, os.PathLike)):
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(svg)
+    else:
+        # text mode can not be told reliably from the type (e.g. tempfile's wrappers), so str is tried first
+        try:
+            filename.write(svg)
+        except TypeError:
+            filename.write(svg.encode('utf-8'))
 
-def _draw(strokes, lines, filename, stroke_colors=None, stroke_widths=None):
+
+def _document(strokes, lines, stroke_colors=None, stroke_widths=None, precision=None, direct=False,
+              simplify=None, relative=False):
+    """
+    The svg document drawn by _draw, as a string
+    """
     stroke_colors = stroke_colors or ['black'] * len(lines)
     stroke_widths = stroke_widths or [2] * len(lines)
+    view_width, view_height, coords = _layout(strokes, lines, simplify=simplify)
 
-    line_height = 60
-    view_width = 1000
-    view_height = line_height * (len(strokes) + 1)
+    paths = [
+        (_path_data(line_coords, precision, relative), color, width)
+        for line_coords, color, width in zip(coords, stroke_colors, stroke_widths)
+        if line_coords is not None
+    ]
 
-    dwg = svgwrite.Drawing(filename=filename)
+    if direct:
+        return _svg_header.format(width=view_width, height=view_height) + ''.join(
+            _svg_path.format(d=d, color=_attribute(color), width=_attribute(width)) for d, color, width in paths
+        ) + _svg_footer
+
+    dwg = svgwrite.Drawing()
     dwg.viewbox(width=view_width, height=view_height)
     dwg.add(dwg.rect(insert=(0, 0), size=(view_width, view_height), fill='white'))
+    for d, color, width in paths:
+        path = svgwrite.path.Path(d)
+        path = path.stroke(color=color, width=width, linecap='round').fill("none")
+        dwg.add(path)
 
-    initial_coord = np.array([0, -(3 * line_height / 4)])
-    for offsets, line, color, width in zip(strokes, lines, stroke_colors, stroke_widths):
+    f = io.StringIO()
+    dwg.write(f)
+    return f.getvalue()
 
-        if not line:
-            initial_coord[1] -= line_height
-            continue
 
-        offsets[:, :2] *= 1.5
-        strokes = drawing.offsets_to_coords(offsets)
-        strokes = drawing.denoise(strokes)
-        strokes[:, :2] = drawing.align(strokes[:, :2])
+def _layout(strokes, lines, line_height=60, view_width=1000, simplify=None):
+    """
+    Lays out the sampled offsets of each line on a page of view_width svg units, one line every line_height
+    units.  Returns the page's width and height and the post-processed [x, y, eos] coordinates of each line
+    (None for empty lines).  The lines are post-processed together, as one drawing.RaggedStrokes, and if
+    simplify is given, simplified to that tolerance after they are denoised and aligned.
+    """
+    view_height = line_height * (len(strokes) + 1)
 
-        strokes[:, 1] *= -1
-        strokes[:, :2] -= strokes[:, :2].min() + initial_coord
-        strokes[:, 0] += (view_width - strokes[:, 0].max()) / 2
+    drawn = [i for i, line in enumerate(lines) if line]
+    page = drawing.RaggedStrokes.from_lines([strokes[i] for i in drawn])
+    page.coords[:, :2] *= 1.5
+    page = page.offsets_to_coords().denoise().align()
+    if simplify is not None:
+        page = page.simplify(simplify)
 
-        prev_eos = 1.0
-        p = "M{},{} ".format(0, 0)
-        for x, y, eos in zip(*strokes.T):
-            p += '{}{},{} '.format('M' if prev_eos == 1.0 else 'L', x, y)
-            prev_eos = eos
-        path = svgwrite.path.Path(p)
-        path = path.stroke(color=color, width=width, linecap='round').fill("none")
-        dwg.add(path)
+    xy = page.coords[:, :2]
+    xy[:, 1] *= -1
+    if len(xy):
+        starts, line_ids = page.line_offsets[:-1], page.line_ids()
+        initial_coord = np.zeros([len(drawn), 2])
+        initial_coord[:, 1] = -(3 * line_height / 4) - line_height * np.array(drawn)
+        xy -= (np.minimum.reduceat(xy.min(axis=1), starts)[:, np.newaxis] + initial_coord)[line_ids]
+        xy[:, 0] += ((view_width - np.maximum.reduceat(xy[:, 0], starts)) / 2)[line_ids]
+
+    coords = [None] * len(lines)
+    for i, line_coords in zip(drawn, page.to_lines()):
+        coords[i] = line_coords
+    return view_width, view_height, coords
+
+
+def _path_data(strokes, precision=None, relative=False):
+    """
+    svg path data of the [x, y, eos] points in strokes: a move to the first point of every stroke and lines
+    through the rest of it.  Rather than formatting point by point, one format string holding the command
+    of every point is filled in with all of the coordinates at once.
+    """
+    if relative:
+        return _relative_path_data(strokes, precision)
+    number = '%s' if precision is None else '%.{}f'.format(precision)
+    point = '{0},{0} '.format(number)
+    # a point starts a stroke if the one before it ended one
+    prev_eos = np.concatenate([[1.0], strokes[:-1, 2]])
+    commands = np.where(prev_eos == 1.0, 'M' + point, 'L' + point)
+    return 'M0,0 ' + ''.join(commands.tolist()) % tuple(strokes[:, :2].ravel().tolist())
+
+
+def _relative_path_data(strokes, precision=None):
+    """
+    Compact svg path data of the same points as _path_data: a relative move to the first point of every
+    stroke, followed by the offsets to the rest of its points, which svg takes as relative lines.  With
+    precision, the points are rounded before the offsets between them are taken, so that rounding errors
+    do not add up along a line, and every offset is written with as few of the decimals as it needs.
+    """
+    # a point starts a stroke if the one before it ended one
+    starts = np.concatenate([[1.0], strokes[:-1, 2]]) == 1.0
+    if precision is None:
+        offsets = np.diff(strokes[:, :2], axis=0, prepend=0)
+        commands = np.where(starts, 'm%s,%s', ' %s,%s')
+    else:
+        scale = 10 ** precision
+        offsets = np.diff(np.round(strokes[:, :2] * scale).astype(np.int64), axis=0, prepend=0)
+        # offsets in steps of 10 ** -precision, ending in as many zeros as they have decimals to spare
+        decimals = np.full(offsets.shape, precision)
+        for zeros in range(1, precision + 1):
+            decimals[offsets % 10 ** zeros == 0] = precision - zeros
+        numbers = ['%.{}f'.format(i) for i in range(precision + 1)]
+        templates = np.array([[[
+            separator + x + ',' + y for y in numbers] for x in numbers] for separator in [' ', 'm']])
+        commands = templates[starts.astype(int), decimals[:, 0], decimals[:, 1]]
+        offsets = offsets / scale
+    # adding 0 turns -0.0 into 0.0
+    return ''.join(commands.tolist()) % tuple((offsets + 0.0).ravel().tolist())
 
-        initial_coord[1] -= line_height
 
-    dwg.save()
+def _attribute(value):
+    return escape(str(value), _attribute_entities)
@@ -0,0 +1,157 @@
+import struct
+import zlib
+
+import numpy as np
+
+from handwriting_synthesis.hand._draw import _layout
+
+# svg user units are css pixels, of which there are 96 per inch
+_svg_dpi = 96
+
+# segments are split into pieces of at most this many pixels, so that each is drawn in a small window
+_max_segment_length = 4.0
+
+_named_colors = {
+    'black': (0, 0, 0),
+    'white': (255, 255, 255),
+    'red': (255, 0, 0),
+    'green': (0, 128, 0),
+    'blue': (0, 0, 255),
+    'yellow': (255, 255, 0),
+    'cyan': (0, 255, 255),
+    'magenta': (255, 0, 255),
+    'gray': (128, 128, 128),
+    'grey': (128, 128, 128),
+    'silver': (192, 192, 192),
+    'maroon': (128, 0, 0),
+    'olive': (128, 128, 0),
+    'lime': (0, 255, 0),
+    'aqua': (0, 255, 255),
+    'teal': (0, 128, 128),
+    'navy': (0, 0, 128),
+    'fuchsia': (255, 0, 255),
+    'purple': (128, 0, 128),
+    'orange': (255, 165, 0),
+}
+
+
+def _raster(strokes, lines, stroke_colors=None, stroke_widths=None, dpi=_svg_dpi):
+    """
+    Draws the page _draw would draw into an [height, width, 3] uint8 rgb image, at dpi pixels per inch
+    (the svg's units are 1/96 inch).  Every pen down segment is drawn as an anti-aliased line with round
+    caps, stroke_widths svg units wide.
+    """
+    stroke_colors, stroke_widths = _stroke_styles(stroke_colors, stroke_widths, len(lines))
+    view_width, view_height, coords = _layout(strokes, lines)
+
+    scale = dpi / _svg_dpi
+    image = np.ones([int(round(view_height * scale)), int(round(view_width * scale)), 3], dtype=np.float32)
+    for line_coords, color, width in zip(coords, stroke_colors, stroke_widths):
+        if line_coords is None:
+            continue
+        _stroke(image, line_coords[:, :2] * scale, line_coords[:, 2], color, width * scale / 2)
+    return np.round(image * 255).astype(np.uint8)
+
+
+def _stroke_styles(stroke_colors, stroke_widths, num_lines):
+    """
+    The rgb color and the width of each line, from the svg stroke colors and widths (numbers or numeric
+    strings).  Raises ValueError for a color or width which can not be rastered.
+    """
+    colors = [_color(color) for color in stroke_colors or ['black'] * num_lines]
+    widths = []
+    for width in stroke_widths or [2] * num_lines:
+        try:
+            widths.append(float(width))
+        except (TypeError, ValueError):
+            raise ValueError('unsupported stroke width {!r}'.format(width))
+    return colors, widths
+
+
+def _stroke(image, points, eos, color, radius):
+    """
+    Blends the segments between consecutive points of each stroke into image, in color.
+
+    Long segments are first split into pieces of at most _max_segment_length pixels.  The coverage of every
+    pixel in a square window around each piece is then computed at once from its distance to the piece (a
+    capsule, so the ends are round), and where pieces overlap the highest coverage is kept, so that joints
+    are not drawn twice.
+    """
+    # a segment ends at every point which does not start a stroke
+    pen_down = np.flatnonzero(eos[:-1] != 1.0)
+    starts, ends = points[pen_down], points[pen_down + 1]
+    if len(starts) == 0:
+        return
+
+    num_pieces = np.maximum(np.ceil(np.linalg.norm(ends - starts, axis=1) / _max_segment_length), 1).astype(int)
+    segment = np.repeat(np.arange(len(starts)), num_pieces)
+    piece = np.arange(len(segment)) - np.repeat(np.cumsum(num_pieces) - num_pieces, num_pieces)
+    step = ((ends - starts) / num_pieces[:, np.newaxis])[segment]
+    a = starts[segment] + piece[:, np.newaxis] * step
+    b = a + step
+
+    window = int(np.ceil(_max_segment_length + 2 * radius + 2))
+    top_left = np.floor(np.minimum(a, b) - radius - .5).astype(int)
+    offsets = np.arange(window)
+    x = top_left[:, np.newaxis, 0:1] + offsets[np.newaxis, np.newaxis, :]
+    y = top_left[:, 1:2, np.newaxis] + offsets[np.newaxis, :, np.newaxis]
+
+    # distance of each pixel's center to its piece
+    px, py = x + .5 - a[:, 0, np.newaxis, np.newaxis], y + .5 - a[:, 1, np.newaxis, np.newaxis]
+    dx, dy = step[:, 0, np.newaxis, np.newaxis], step[:, 1, np.newaxis, np.newaxis]
+    length_2 = np.maximum(dx * dx + dy * dy, 1e-12)
+    t = np.clip((px * dx + py * dy) / length_2, 0.0, 1.0)
+    distance = np.hypot(px - t * dx, py - t * dy)
+    coverage = np.clip(radius - distance + .5, 0.0, 1.0)
+
+    height, width = image.shape[:2]
+    x, y = np.broadcast_to(x, coverage.shape).ravel(), np.broadcast_to(y, coverage.shape).ravel()
+    coverage = coverage.ravel()
+    visible = (coverage > 0) & (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    index, coverage = y[visible] * width + x[visible], coverage[visible]
+
+    touched, inverse = np.unique(index, return_inverse=True)
+    # with repeated indices, the last assignment wins, so assigning in order of coverage keeps the maximum
+    order = np.argsort(coverage, kind='stable')
+    alpha = np.zeros(len(touched), dtype=np.float32)
+    alpha[inverse[order]] = coverage[order]
+
+    pixels = image.reshape(-1, 3)
+    pixels[touched] += (np.asarray(color, dtype=np.float32) / 255 - pixels[touched]) * alpha[:, np.newaxis]
+
+
+def _color(color):
+    """rgb tuple of a css color name, #rgb or #rrggbb color"""
+    if not isinstance(color, str):
+        raise ValueError('unsupported stroke color {!r}'.format(color))
+    if color in _named_colors:
+        return _named_colors[color]
+    if color.startswith('#') and len(color) in (4, 7):
+        digits = color[1:] if len(color) == 7 else ''.join(2 * digit for digit in color[1:])
+        try:
+            return tuple(int(digits[i:i + 2], 16) for i in (0, 2, 4))
+        except ValueError:
+            pass
+    raise ValueError('unsupported stroke color {!r}'.format(color))
+
+
+def _png(image, dpi=_svg_dpi, compression=6):
+    """
+    Encodes an [height, width, 3] uint8 rgb image as png, recording its resolution.  compression is the zlib
+    level, from 1 (fastest) to 9 (smallest).
+    """
+    height, width = image.shape[:2]
+    # every row is prefixed with filter type 0 (no filter)
+    rows = np.concatenate([np.zeros([height, 1], dtype=np.uint8), image.reshape(height, -1)], axis=1)
+    pixels_per_meter = int(round(dpi / .0254))
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        _chunk(b'pHYs', struct.pack('>IIB', pixels_per_meter, pixels_per_meter, 1)),
+        _chunk(b'IDAT', zlib.compress(rows.tobytes(), compression)),
+        _chunk(b'IEND', b''),
+    ])
+
+
+def _chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+def _schedule(costs, max_batch_size, max_padding):
+    """
+    Groups samples into batches in order of increasing cost (e.g. timesteps to run), such that each
+    batch has at most max_batch_size samples and no sample costs more than (1 + max_padding) times
+    the cheapest sample of its batch.  If max_padding is None, batches are only limited by size.
+    Returns a list of index lists into costs.
+    """
+    batches = []
+    for i in np.argsort(costs, kind='stable'):
+        if (
+                batches
+                and len(batches[-1]) < max_batch_size
+                and (max_padding is None or costs[i] <= (1 + max_padding) * costs[batches[-1][0]])
+        ):
+            batches[-1].append(i)
+        else:
+            batches.append([i])
+    return batches
+
+
+def _bucket(size, min_size=16):
+    """
+    Rounds size up to the next power of two (at least min_size), so that padded dimensions only take a
+    few distinct values
+    """
+    bucket = min_size
+    while bucket < size:
+        bucket *= 2
+    return bucket
+
+
+def _shard(costs, num_shards):
+    """
+    Splits samples into at most num_shards groups of similar total cost, assigning samples in order of
+    decreasing cost to the group with the lowest total so far.  Returns a list of non-empty, sorted index
+    lists into costs.
+    """
+    shards = [[] for _ in range(num_shards)]
+    totals = np.zeros(num_shards)
+    for i in np.argsort(costs, kind='stable')[::-1]:
+        shard = np.argmin(totals)
+        shards[shard].append(i)
+        totals[shard] += costs[i]
+    return [sorted(shard) for shard in shards if shard]
@@ -0,0 +1,14 @@
+import json
+
+
+def _session_options(session_options):
+    """
+    Keyword arguments of handwriting_synthesis.tf.utils.session_config given as a dict, or as the filename
+    of a json profile written by handwriting_synthesis.hand.autotune.  None gives no options.
+    """
+    if session_options is None:
+        return {}
+    if isinstance(session_options, str):
+        with open(session_options) as f:
+            return json.load(f)
+    return dict(session_options)
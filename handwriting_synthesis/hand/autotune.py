@@ -0,0 +1,91 @@
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from handwriting_synthesis.config import session_profile_path
+
+# a mix of short and long lines, like the pages written by main.py
+default_lines = [
+    "Father time, I'm running late",
+    "I'm winding down, I'm growing tired",
+    "Seconds drift into the night",
+    "The clock just ticks till my time expires",
+    "Making my way downtown",
+    "Walking fast",
+    "Never gonna run around and desert you",
+    "She was looking kind of dumb with her finger and her thumb",
+]
+
+
+def autotune(filename=session_profile_path, lines=None, num_repeats=3, thread_counts=None, verbose=True,
+             **hand_kwargs):
+    """
+    Sweeps the tensorflow session options of Hand over a sampling workload and writes the fastest ones to
+    filename as json, to be loaded with Hand(session_options=filename).
+
+    The options are tuned one at a time (intra_op_threads, inter_op_threads, use_per_session_threads,
+    opt_level, then grappler), each keeping the best values found for the ones before it, which takes a
+    fraction of the time of a full grid.  Every setting is measured in a fresh process, since tensorflow
+    creates its thread pools once per process.
+
+    Args:
+        filename: Where the best options are written.
+        lines: Lines sampled as the workload.  Defaults to a mix of short and long lines.
+        num_repeats: Number of times the workload is sampled (after a warm up run) per setting.
+        thread_counts: Thread pool sizes to try, by default powers of two up to the number of cores.
+        verbose: If true, prints the lines/sec of each setting.
+        hand_kwargs: Passed on to Hand (e.g. frozen_graph), so that the profile is tuned for the same model.
+
+    Returns:
+        The best options, as a dict of keyword arguments of handwriting_synthesis.tf.utils.session_config.
+    """
+    lines = lines or default_lines
+    num_cores = os.cpu_count() or 1
+    thread_counts = thread_counts or sorted({2 ** i for i in range(num_cores.bit_length())} | {num_cores})
+    sweep = [
+        ('intra_op_threads', thread_counts),
+        ('inter_op_threads', thread_counts),
+        ('use_per_session_threads', [False, True]),
+        ('opt_level', ['L1', 'L0']),
+        ('grappler', [True, False]),
+    ]
+
+    context = multiprocessing.get_context('spawn')
+    rates = {}
+    best = {}
+    for name, values in sweep:
+        for value in values:
+            options = dict(best, **{name: value})
+            key = json.dumps(options, sort_keys=True)
+            if key not in rates:
+                with context.Pool(1) as pool:
+                    rates[key] = pool.apply(_measure, (options, hand_kwargs, lines, num_repeats))
+                if verbose:
+                    print('{:>8.2f} lines/sec  {}'.format(rates[key], key))
+        best = max(
+            (dict(best, **{name: value}) for value in values),
+            key=lambda options: rates[json.dumps(options, sort_keys=True)]
+        )
+
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    with open(filename, 'w') as f:
+        json.dump(best, f, indent=2, sort_keys=True)
+    return best
+
+
+def _measure(session_options, hand_kwargs, lines, num_repeats):
+    from handwriting_synthesis.hand.Hand import Hand
+
+    hand = Hand(session_options=session_options, **hand_kwargs)
+    biases = [.75] * len(lines)
+    hand._sample(lines, biases=biases)
+    start = time.time()
+    for _ in range(num_repeats):
+        hand._sample(lines, biases=biases)
+    return num_repeats * len(lines) / (time.time() - start)
+
+
+if __name__ == '__main__':
+    print(autotune(*sys.argv[1:2]))
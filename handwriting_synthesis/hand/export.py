@@ -0,0 +1,21 @@
+import sys
+
+from handwriting_synthesis.config import frozen_graph_path
+from handwriting_synthesis.hand.Hand import Hand
+
+
+def export(filename=frozen_graph_path, attention_band=None):
+    """
+    Restores the checkpointed model and writes a frozen, constant-folded sampling graph which can be
+    loaded with Hand(frozen_graph=filename).  attention_band is passed on to Hand.
+    """
+    hand = Hand(attention_band=attention_band, state_sampling=True)
+    hand.nn.freeze(
+        filename,
+        [hand.nn.sampled_sequence, hand.nn.sampled_sequence_from_state, hand.nn.sampled_chunk]
+        + list(hand.nn.primed_state) + list(hand.nn.chunk_final_state)
+    )
+
+
+if __name__ == '__main__':
+    export(*sys.argv[1:2])
@@ -3,8 +3,6 @@ from collections import namedtuple
 import numpy as np
 import tensorflow as tf
 import tensorflow.compat.v1 as tfcompat
-import tensorflow.compat.v1.distributions as tfd
-import tensorflow_probability as tfp
 
 from handwriting_synthesis.tf.utils import dense_layer, shape
 
@@ -29,8 +27,21 @@ class LSTMAttentionCell(tfcompat.nn.rnn_cell.RNNCell):
             num_output_mixture_components,
             bias,
             reuse=None,
+            fused_lstm=False,
+            attention_band=None,
     ):
+        """
+        fused_lstm runs each of the three LSTMs as a single LSTMBlockCell op (concat, matmul and gates in
+        one kernel) instead of LSTMCell's separate ops.  Both create the same variables, so either one
+        restores the same checkpoint.  LSTMBlockCell has no gradient, so fused_lstm is for inference only.
+
+        attention_band, if set, is the number of characters around the current attention position over
+        which the window is evaluated (see _banded_window).  The window is otherwise evaluated over every
+        character, so its cost grows with the length of the attention values.
+        """
         self.reuse = reuse
+        self.fused_lstm = fused_lstm
+        self.attention_band = attention_band
         self.lstm_size = lstm_size
         self.num_attn_mixture_components = num_attn_mixture_components
         self.attention_values = attention_values
@@ -77,12 +88,28 @@ class LSTMAttentionCell(tfcompat.nn.rnn_cell.RNNCell):
             tf.zeros([batch_size, self.char_len]),
         )
 
+    def gather(self, indices):
+        """
+        Returns a cell whose per-sample tensors (attention values, their lengths and the bias)
+        are restricted to the batch rows given by indices.  Variables are shared with this cell.
+        """
+        return LSTMAttentionCell(
+            lstm_size=self.lstm_size,
+            num_attn_mixture_components=self.num_attn_mixture_components,
+            attention_values=tf.gather(self.attention_values, indices),
+            attention_values_lengths=tf.gather(self.attention_values_lengths, indices),
+            num_output_mixture_components=self.num_output_mixture_components,
+            bias=tf.gather(self.bias, indices),
+            reuse=self.reuse,
+            fused_lstm=self.fused_lstm,
+            attention_band=self.attention_band,
+        )
+
     def __call__(self, inputs, state, scope=None):
         with tfcompat.variable_scope(scope or type(self).__name__, reuse=tfcompat.AUTO_REUSE):
             # lstm 1
             s1_in = tf.concat([state.w, inputs], axis=1)
-            cell1 = tfcompat.nn.rnn_cell.LSTMCell(self.lstm_size)
-            s1_out, s1_state = cell1(s1_in, state=(state.c1, state.h1))
+            s1_out, s1_state = self._lstm(s1_in, state.c1, state.h1, 'lstm_cell')
 
             # attention
             attention_inputs = tf.concat([state.w, inputs, s1_out], axis=1)
@@ -94,24 +121,26 @@ class LSTMAttentionCell(tfcompat.nn.rnn_cell.RNNCell):
             kappa_flat, alpha_flat, beta_flat = kappa, alpha, beta
             kappa, alpha, beta = tf.expand_dims(kappa, 2), tf.expand_dims(alpha, 2), tf.expand_dims(beta, 2)
 
-            enum = tf.reshape(tf.range(self.char_len), (1, 1, self.char_len))
-            u = tf.cast(tf.tile(enum, (self.batch_size, self.num_attn_mixture_components, 1)), tf.float32)
-            phi_flat = tf.reduce_sum(alpha * tf.exp(-tf.square(kappa - u) / beta), axis=1)
+            if self.attention_band is not None:
+                w, phi_flat = self._banded_window(alpha, beta, kappa)
+            else:
+                enum = tf.reshape(tf.range(self.char_len), (1, 1, self.char_len))
+                u = tf.cast(tf.tile(enum, (self.batch_size, self.num_attn_mixture_components, 1)), tf.float32)
+                phi_flat = tf.reduce_sum(alpha * tf.exp(-tf.square(kappa - u) / beta), axis=1)
 
-            phi = tf.expand_dims(phi_flat, 2)
-            sequence_mask = tf.cast(tf.sequence_mask(self.attention_values_lengths, maxlen=self.char_len), tf.float32)
-            sequence_mask = tf.expand_dims(sequence_mask, 2)
-            w = tf.reduce_sum(phi * self.attention_values * sequence_mask, axis=1)
+                phi = tf.expand_dims(phi_flat, 2)
+                sequence_mask = tf.cast(
+                    tf.sequence_mask(self.attention_values_lengths, maxlen=self.char_len), tf.float32)
+                sequence_mask = tf.expand_dims(sequence_mask, 2)
+                w = tf.reduce_sum(phi * self.attention_values * sequence_mask, axis=1)
 
             # lstm 2
             s2_in = tf.concat([inputs, s1_out, w], axis=1)
-            cell2 = tfcompat.nn.rnn_cell.LSTMCell(self.lstm_size)
-            s2_out, s2_state = cell2(s2_in, state=(state.c2, state.h2))
+            s2_out, s2_state = self._lstm(s2_in, state.c2, state.h2, 'lstm_cell_1')
 
             # lstm 3
             s3_in = tf.concat([inputs, s2_out, w], axis=1)
-            cell3 = tfcompat.nn.rnn_cell.LSTMCell(self.lstm_size)
-            s3_out, s3_state = cell3(s3_in, state=(state.c3, state.h3))
+            s3_out, s3_state = self._lstm(s3_in, state.c3, state.h3, 'lstm_cell_2')
 
             new_state = LSTMAttentionCellState(
                 s1_state.h,
@@ -129,35 +158,81 @@ class LSTMAttentionCell(tfcompat.nn.rnn_cell.RNNCell):
 
             return s3_out, new_state
 
+    def _banded_window(self, alpha, beta, kappa):
+        """
+        Evaluates the attention window only at attention_band consecutive characters, starting half a band
+        before the alpha weighted mean of kappa (kappa only moves forward and the window is narrow).  The
+        band is shifted to stay within the characters.  Returns w and phi, which is zero outside the band.
+        """
+        band = self.attention_band
+        center = tf.reduce_sum(alpha * kappa, axis=1) / tf.maximum(tf.reduce_sum(alpha, axis=1), 1e-8)
+        start = tf.cast(tf.floor(center[:, 0]), tf.int32) - band // 2
+        start = tf.clip_by_value(start, 0, tf.maximum(self.char_len - band, 0))
+
+        # bands reaching past char_len (only when char_len < band) are masked and clamped to a valid index
+        positions = tf.expand_dims(start, 1) + tf.range(band)
+        in_range = tf.cast(positions < self.char_len, tf.float32)
+        positions = tf.minimum(positions, self.char_len - 1)
+
+        u = tf.cast(tf.expand_dims(positions, 1), tf.float32)
+        phi_band = tf.reduce_sum(alpha * tf.exp(-tf.square(kappa - u) / beta), axis=1) * in_range
+
+        sequence_mask = tf.cast(positions < tf.expand_dims(self.attention_values_lengths, 1), tf.float32)
+        values = tf.gather(self.attention_values, positions, batch_dims=1)
+        w = tf.reduce_sum(tf.expand_dims(phi_band * sequence_mask, 2) * values, axis=1)
+
+        rows = tf.tile(tf.expand_dims(tf.range(self.batch_size), 1), [1, band])
+        phi = tf.scatter_nd(tf.stack([rows, positions], axis=2), phi_band, [self.batch_size, self.char_len])
+        return w, phi
+
+    def _lstm(self, inputs, c, h, name):
+        """
+        Returns (output, LSTMStateTuple) of one LSTM step.  name is the variable scope of the cell's kernel
+        and bias, as created by LSTMCell.
+        """
+        if not self.fused_lstm:
+            cell = tfcompat.nn.rnn_cell.LSTMCell(self.lstm_size)
+            return cell(inputs, state=(c, h))
+
+        with tfcompat.variable_scope(name):
+            kernel = tfcompat.get_variable('kernel', shape=[shape(inputs, 1) + self.lstm_size, 4 * self.lstm_size])
+            bias = tfcompat.get_variable('bias', shape=[4 * self.lstm_size], initializer=tf.zeros_initializer())
+        # gates are laid out as i, j, f, o in the kernel like LSTMCell, and there are no peepholes
+        no_peephole = tf.zeros([self.lstm_size])
+        _, c, _, _, _, _, h = tf.raw_ops.LSTMBlockCell(
+            x=inputs, cs_prev=c, h_prev=h, w=kernel, wci=no_peephole, wcf=no_peephole, wco=no_peephole,
+            b=bias, forget_bias=1.0, cell_clip=-1.0, use_peephole=False)
+        return h, tfcompat.nn.rnn_cell.LSTMStateTuple(c, h)
+
     def output_function(self, state):
         params = dense_layer(state.h3, self.output_units, scope='gmm', reuse=tfcompat.AUTO_REUSE)
         pis, mus, sigmas, rhos, es = self._parse_parameters(params)
         mu1, mu2 = tf.split(mus, 2, axis=1)
-        mus = tf.stack([mu1, mu2], axis=2)
         sigma1, sigma2 = tf.split(sigmas, 2, axis=1)
 
-        covar_matrix = [tf.square(sigma1), rhos * sigma1 * sigma2,
-                        rhos * sigma1 * sigma2, tf.square(sigma2)]
-        covar_matrix = tf.stack(covar_matrix, axis=2)
-        covar_matrix = tf.reshape(covar_matrix, (self.batch_size, self.num_output_mixture_components, 2, 2))
-
-        mvn = tfp.distributions.MultivariateNormalFullCovariance(loc=mus, covariance_matrix=covar_matrix)
-        b = tfd.Bernoulli(probs=es)
-        c = tfd.Categorical(probs=pis)
-
-        sampled_e = b.sample()
-        sampled_coords = mvn.sample()
-        sampled_idx = c.sample()
-
+        # choose the mixture component first and only sample that component's bivariate normal,
+        # x2 is drawn conditionally on x1 using rho in place of a cholesky factor of the covariance
+        sampled_idx = tf.cast(tfcompat.random.categorical(tf.math.log(pis), 1)[:, 0], tf.int32)
         idx = tf.stack([tf.range(self.batch_size), sampled_idx], axis=1)
-        coords = tf.gather_nd(sampled_coords, idx)
-        return tf.concat([coords, tf.cast(sampled_e, tf.float32)], axis=1)
+        component_params = tf.gather_nd(tf.stack([mu1, mu2, sigma1, sigma2, rhos], axis=2), idx)
+        mu1, mu2, sigma1, sigma2, rho = tf.unstack(component_params, axis=1)
+
+        z1, z2 = tf.unstack(tf.random.normal([2, self.batch_size]))
+        x1 = mu1 + sigma1 * z1
+        x2 = mu2 + sigma2 * (rho * z1 + tf.sqrt(1.0 - tf.square(rho)) * z2)
+        sampled_e = tf.cast(tf.random.uniform([self.batch_size]) < es[:, 0], tf.float32)
+        return tf.stack([x1, x2, sampled_e], axis=1)
 
-    def termination_condition(self, state):
+    def termination_condition(self, state, output=None):
+        """
+        output is the sample drawn from state by output_function.  Pass it in when it has already been
+        drawn so that termination is decided by the same sample that is emitted, without drawing again.
+        """
         char_idx = tf.cast(tf.argmax(state.phi, axis=1), tf.int32)
         final_char = char_idx >= self.attention_values_lengths - 1
         past_final_char = char_idx >= self.attention_values_lengths
-        output = self.output_function(state)
+        if output is None:
+            output = self.output_function(state)
         es = tf.cast(output[:, 2], tf.int32)
         is_eos = tf.equal(es, tf.experimental.numpy.ones_like(es))
         return tf.logical_or(tf.logical_and(final_char, is_eos), past_final_char)
@@ -6,6 +6,7 @@ import tensorflow.compat.v1 as tfcompat
 
 from handwriting_synthesis import drawing
 from handwriting_synthesis.rnn import LSTMAttentionCell
+from handwriting_synthesis.rnn.LSTMAttentionCell import LSTMAttentionCellState
 from handwriting_synthesis.rnn.operations import rnn_free_run
 from handwriting_synthesis.tf import BaseModel
 from handwriting_synthesis.tf.utils import time_distributed_dense_layer
@@ -14,11 +15,18 @@ tfcompat.disable_v2_behavior()
 
 
 class RNN(BaseModel):
+    state_fields = list(LSTMAttentionCellState._fields)
+
     def __init__(
             self,
             lstm_size,
             output_mixture_components,
             attention_mixture_components,
+            compact_sampling=False,
+            sample_diagnostics=None,
+            fused_lstm=False,
+            attention_band=None,
+            state_sampling=False,
             **kwargs
     ):
         self.x = None
@@ -35,10 +43,22 @@ class RNN(BaseModel):
         self.initial_state = None
         self.final_state = None
         self.sampled_sequence = None
+        self.sampled_diagnostics = None
+        self.primed_state = None
+        self.sample_initial_state = None
+        self.sampled_sequence_from_state = None
+        self.chunk_initial_input = None
+        self.sampled_chunk = None
+        self.chunk_final_state = None
         self.lstm_size = lstm_size
         self.output_mixture_components = output_mixture_components
         self.output_units = self.output_mixture_components * 6 + 1
         self.attention_mixture_components = attention_mixture_components
+        self.compact_sampling = compact_sampling
+        self.sample_diagnostics = sample_diagnostics
+        self.fused_lstm = fused_lstm
+        self.attention_band = attention_band
+        self.state_sampling = state_sampling
         super(RNN, self).__init__(**kwargs)
 
     def parse_parameters(self, z, eps=1e-8, sigma_eps=1e-4):
@@ -95,17 +115,14 @@ class RNN(BaseModel):
             tf.zeros([self.num_samples, 2]),
             tf.ones([self.num_samples, 1]),
         ], axis=1)
-        return rnn_free_run(
-            cell=cell,
-            sequence_length=self.sample_tsteps,
-            initial_state=initial_state,
-            initial_input=initial_input,
-            scope='rnn'
-        )[1]
+        return self.free_run(cell, initial_state, initial_input)
 
     def primed_sample(self, cell):
+        return self.free_run(cell, self.prime_state(cell))
+
+    def prime_state(self, cell):
         initial_state = cell.zero_state(self.num_samples, dtype=tf.float32)
-        primed_state = tfcompat.nn.dynamic_rnn(
+        return tfcompat.nn.dynamic_rnn(
             inputs=self.x_prime,
             cell=cell,
             sequence_length=self.x_prime_len,
@@ -113,36 +130,106 @@ class RNN(BaseModel):
             initial_state=initial_state,
             scope='rnn'
         )[1]
-        return rnn_free_run(
+
+    def free_run(self, cell, initial_state, initial_input=None):
+        """
+        Returns the sampled outputs and a dict of the state fields named in sample_diagnostics
+        for every timestep.  No other state history is recorded.
+        """
+        states, outputs, _ = rnn_free_run(
             cell=cell,
             sequence_length=self.sample_tsteps,
-            initial_state=primed_state,
+            initial_state=initial_state,
+            initial_input=initial_input,
+            compact=self.compact_sampling,
+            emit_states=self.sample_diagnostics or False,
             scope='rnn'
-        )[1]
+        )
+        return outputs, states if self.sample_diagnostics else {}
 
-    def calculate_loss(self):
-        self.x = tfcompat.placeholder(tf.float32, [None, None, 3])
-        self.y = tfcompat.placeholder(tf.float32, [None, None, 3])
-        self.x_len = tfcompat.placeholder(tf.int32, [None])
-        self.c = tfcompat.placeholder(tf.int32, [None, None])
-        self.c_len = tfcompat.placeholder(tf.int32, [None])
-
-        self.sample_tsteps = tfcompat.placeholder(tf.int32, [])
-        self.num_samples = tfcompat.placeholder(tf.int32, [])
-        self.prime = tfcompat.placeholder(tf.bool, [])
-        self.x_prime = tfcompat.placeholder(tf.float32, [None, None, 3])
-        self.x_prime_len = tfcompat.placeholder(tf.int32, [None])
+    def build_cell(self):
+        self.c = tfcompat.placeholder(tf.int32, [None, None], name='c')
+        self.c_len = tfcompat.placeholder(tf.int32, [None], name='c_len')
+
+        # either one timestep budget for the whole batch or a vector with one budget per sample
+        self.sample_tsteps = tfcompat.placeholder(tf.int32, None, name='sample_tsteps')
+        self.num_samples = tfcompat.placeholder(tf.int32, [], name='num_samples')
+        self.prime = tfcompat.placeholder(tf.bool, [], name='prime')
+        self.x_prime = tfcompat.placeholder(tf.float32, [None, None, 3], name='x_prime')
+        self.x_prime_len = tfcompat.placeholder(tf.int32, [None], name='x_prime_len')
         self.bias = tfcompat.placeholder_with_default(
-            tf.zeros([self.num_samples], dtype=tf.float32), [None])
+            tf.zeros([self.num_samples], dtype=tf.float32), [None], name='bias')
 
-        cell = LSTMAttentionCell(
+        return LSTMAttentionCell(
             lstm_size=self.lstm_size,
             num_attn_mixture_components=self.attention_mixture_components,
             attention_values=tf.one_hot(self.c, len(drawing.alphabet)),
             attention_values_lengths=self.c_len,
             num_output_mixture_components=self.output_mixture_components,
-            bias=self.bias
+            bias=self.bias,
+            fused_lstm=self.fused_lstm,
+            attention_band=self.attention_band
         )
+
+    def build_sampled_sequence(self, cell):
+        sampled_sequence, self.sampled_diagnostics = tf.cond(
+            self.prime,
+            lambda: self.primed_sample(cell),
+            lambda: self.sample(cell)
+        )
+        return tf.identity(sampled_sequence, name='sampled_sequence')
+
+    def build_state_sampling(self, cell):
+        """
+        Exposes priming and sampling from a given state as separate steps, so that the state after
+        priming with a style (primed_state) can be computed once and fed back in (sample_initial_state)
+        for every line written in that style.
+        """
+        self.primed_state = LSTMAttentionCellState(*[
+            tf.identity(tensor, name='primed_state_{}'.format(field))
+            for field, tensor in zip(LSTMAttentionCellState._fields, self.prime_state(cell))
+        ])
+        self.sample_initial_state = LSTMAttentionCellState(*[
+            tfcompat.placeholder(tf.float32, tensor.shape, name='initial_state_{}'.format(field))
+            for field, tensor in zip(LSTMAttentionCellState._fields, self.primed_state)
+        ])
+        sampled_sequence, _ = self.free_run(cell, self.sample_initial_state)
+        self.sampled_sequence_from_state = tf.identity(sampled_sequence, name='sampled_sequence_from_state')
+
+    def build_chunk_sampling(self, cell):
+        """
+        Samples at most sample_tsteps timesteps from sample_initial_state and chunk_initial_input, and also
+        returns the state reached (chunk_final_state).  Feeding that state and the last sampled output back
+        in continues sampling where the chunk stopped, so a sequence can be sampled and streamed out in
+        chunks.  chunk_initial_input defaults to an output sampled from sample_initial_state.
+        """
+        with tfcompat.variable_scope('rnn', reuse=tfcompat.AUTO_REUSE):
+            sampled_input = cell.output_function(self.sample_initial_state)
+        self.chunk_initial_input = tfcompat.placeholder_with_default(
+            sampled_input, [None, 3], name='chunk_initial_input')
+
+        _, sampled_chunk, final_state = rnn_free_run(
+            cell=cell,
+            sequence_length=self.sample_tsteps,
+            initial_state=self.sample_initial_state,
+            initial_input=self.chunk_initial_input,
+            compact=self.compact_sampling,
+            emit_states=False,
+            scope='rnn'
+        )
+        self.sampled_chunk = tf.identity(sampled_chunk, name='sampled_chunk')
+        self.chunk_final_state = LSTMAttentionCellState(*[
+            tf.identity(tensor, name='chunk_final_state_{}'.format(field))
+            for field, tensor in zip(LSTMAttentionCellState._fields, final_state)
+        ])
+
+    def calculate_loss(self):
+        assert not self.fused_lstm, 'fused LSTM kernels have no gradient, use them with inference_only=True'
+        self.x = tfcompat.placeholder(tf.float32, [None, None, 3])
+        self.y = tfcompat.placeholder(tf.float32, [None, None, 3])
+        self.x_len = tfcompat.placeholder(tf.int32, [None])
+
+        cell = self.build_cell()
         self.initial_state = cell.zero_state(tf.shape(self.x)[0], dtype=tf.float32)
         outputs, self.final_state = tfcompat.nn.dynamic_rnn(
             inputs=self.x,
@@ -156,9 +243,20 @@ class RNN(BaseModel):
         pis, mus, sigmas, rhos, es = self.parse_parameters(params)
         sequence_loss, self.loss = self.nll(self.y, self.x_len, pis, mus, sigmas, rhos, es)
 
-        self.sampled_sequence = tf.cond(
-            self.prime,
-            lambda: self.primed_sample(cell),
-            lambda: self.sample(cell)
-        )
+        self.sampled_sequence = self.build_sampled_sequence(cell)
+        if self.state_sampling:
+            self.build_state_sampling(cell)
+            self.build_chunk_sampling(cell)
         return self.loss
+
+    def calculate_outputs(self):
+        """
+        Builds only the sampling subgraph, so that no loss, gradient or optimizer
+        ops (or their slot variables) are created when the model is used for inference.
+        """
+        cell = self.build_cell()
+        self.sampled_sequence = self.build_sampled_sequence(cell)
+        if self.state_sampling:
+            self.build_state_sampling(cell)
+            self.build_chunk_sampling(cell)
+        return self.sampled_sequence
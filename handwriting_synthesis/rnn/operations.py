@@ -13,13 +13,16 @@ from tensorflow.python.util import is_in_graph_mode
 from tensorflow.python.util import nest
 
 
-def raw_rnn(cell, loop_fn, parallel_iterations=None, swap_memory=False, scope=None):
+def raw_rnn(cell, loop_fn, parallel_iterations=None, swap_memory=False, emit_states=True, scope=None):
     """
     raw_rnn adapted from the original tensorflow implementation
     (https://github.com/tensorflow/tensorflow/blob/r1.4/tensorflow/python/ops/rnn.py)
     to emit arbitrarily nested states for each time step (concatenated along the time axis)
     in addition to the outputs at each timestep and the final state
 
+    emit_states controls which states are recorded (see _select_states).  If it is False,
+    no state history is kept and None is returned in its place.
+
     returns (
         states for all timesteps,
         outputs for all timesteps,
@@ -81,9 +84,11 @@ def raw_rnn(cell, loop_fn, parallel_iterations=None, swap_memory=False, scope=No
             flat_emit_size = nest.flatten(emit_structure)
             flat_emit_dtypes = [flat_state[0].dtype] * len(flat_emit_size)
 
+        emitted_state = _select_states(state, emit_states)
+        flat_emitted_state = nest.flatten(emitted_state)
         flat_state_size = [s.shape if s.shape.is_fully_defined() else
-                           array_ops.shape(s) for s in flat_state]
-        flat_state_dtypes = [s.dtype for s in flat_state]
+                           array_ops.shape(s) for s in flat_emitted_state]
+        flat_state_dtypes = [s.dtype for s in flat_emitted_state]
 
         flat_emit_ta = [
             tensor_array_ops.TensorArray(
@@ -114,7 +119,7 @@ def raw_rnn(cell, loop_fn, parallel_iterations=None, swap_memory=False, scope=No
             )
             for i, (dtype_i, size_i) in enumerate(zip(flat_state_dtypes, flat_state_size))
         ]
-        state_ta = nest.pack_sequence_as(structure=state, flat_sequence=flat_state_ta)
+        state_ta = nest.pack_sequence_as(structure=emitted_state, flat_sequence=flat_state_ta)
 
         def condition(unused_time, elements_finished, *_):
             return math_ops.logical_not(math_ops.reduce_all(elements_finished))
@@ -155,7 +160,8 @@ def raw_rnn(cell, loop_fn, parallel_iterations=None, swap_memory=False, scope=No
             next_state = _copy_some_through(state, next_state)
 
             emit_ta = nest.map_structure(lambda ta, emit: ta.write(time, emit), emit_ta, emit_output)
-            state_ta = nest.map_structure(lambda ta, state: ta.write(time, state), state_ta, next_state)
+            state_ta = nest.map_structure(
+                lambda ta, state: ta.write(time, state), state_ta, _select_states(next_state, emit_states))
 
             elements_finished = math_ops.logical_or(elements_finished, next_finished)
 
@@ -173,16 +179,35 @@ def raw_rnn(cell, loop_fn, parallel_iterations=None, swap_memory=False, scope=No
         (state_ta, emit_ta, final_state, final_loop_state) = returned[-4:]
 
         flat_states = nest.flatten(state_ta)
-        flat_states = [array_ops.transpose(ta.stack(), (1, 0, 2)) for ta in flat_states]
-        states = nest.pack_sequence_as(structure=state_ta, flat_sequence=flat_states)
+        flat_states = [
+            array_ops.transpose(_stack(ta, _concat(batch_size, size_i)), (1, 0, 2))
+            for ta, size_i in zip(flat_states, flat_state_size)
+        ]
+        states = nest.pack_sequence_as(structure=state_ta, flat_sequence=flat_states) if emit_states else None
 
         flat_outputs = nest.flatten(emit_ta)
-        flat_outputs = [array_ops.transpose(ta.stack(), (1, 0, 2)) for ta in flat_outputs]
+        flat_outputs = [
+            array_ops.transpose(_stack(ta, _concat(batch_size, size_i)), (1, 0, 2))
+            for ta, size_i in zip(flat_outputs, flat_emit_size)
+        ]
         outputs = nest.pack_sequence_as(structure=emit_ta, flat_sequence=flat_outputs)
 
         return (states, outputs, final_state)
 
 
+def _select_states(state, emit_states):
+    """
+    Picks the part of a cell state that is recorded at every timestep: the whole state if emit_states
+    is True, nothing if it is False, or a dict of the named fields of a namedtuple state if it is a
+    sequence of field names (e.g. ('kappa', 'phi') for attention diagnostics).
+    """
+    if emit_states is True:
+        return state
+    if not emit_states:
+        return ()
+    return {name: getattr(state, name) for name in emit_states}
+
+
 def rnn_teacher_force(inputs, cell, sequence_length, initial_state, scope='dynamic-rnn-teacher-force'):
     """
     Implementation of an rnn with teacher forcing inputs provided.
@@ -212,7 +237,8 @@ def rnn_teacher_force(inputs, cell, sequence_length, initial_state, scope='dynam
     return states, outputs, final_state
 
 
-def rnn_free_run(cell, initial_state, sequence_length, initial_input=None, scope='dynamic-rnn-free-run'):
+def rnn_free_run(cell, initial_state, sequence_length, initial_input=None, compact=False, emit_states=True,
+                 scope='dynamic-rnn-free-run'):
     """
     Implementation of an rnn which feeds its feeds its predictions back to itself at the next timestep.
 
@@ -221,31 +247,177 @@ def rnn_free_run(cell, initial_state, sequence_length, initial_input=None, scope
         cell.output_function(state) which takes in the state at timestep t and returns
         the cell input at timestep t+1.
 
-        cell.termination_condition(state) which returns a boolean tensor of shape
-        [batch_size] denoting which sequences no longer need to be sampled.
+        cell.termination_condition(state, output) which returns a boolean tensor of shape
+        [batch_size] denoting which sequences no longer need to be sampled, given the state
+        and the output sampled from it.
+
+    output_function is evaluated once per timestep; its sample is emitted, decides termination
+    and is fed back as the next input.
+
+    sequence_length is the maximum number of timesteps to sample, either a scalar shared by the
+    whole batch or a [batch_size] vector with one budget per sequence.
+
+    If compact is true, finished sequences are removed from the working batch instead of being
+    carried along until every sequence has finished (see _compact_free_run).  The cell must then
+    also implement cell.gather(indices), returning a cell restricted to the given batch rows.
+
+    emit_states is passed on to raw_rnn.  Set it to False when only the sampled outputs are needed,
+    so that the state history is not stored.
     """
-    with vs.variable_scope(scope, reuse=True):
+    with vs.variable_scope(scope, reuse=vs.AUTO_REUSE):
         if initial_input is None:
             initial_input = cell.output_function(initial_state)
 
+    if compact:
+        return _compact_free_run(
+            cell, initial_state, sequence_length, initial_input, emit_states=emit_states, scope=scope)
+
     def loop_fn(time, cell_output, cell_state, loop_state):
-        next_cell_state = initial_state if cell_output is None else cell_state
+        if cell_output is None:
+            next_cell_state = initial_state
+            next_input = initial_input
+        else:
+            next_cell_state = cell_state
+            next_input = cell.output_function(next_cell_state)
 
         elements_finished = math_ops.logical_or(
             time >= sequence_length,
-            cell.termination_condition(next_cell_state)
-        )
-        finished = math_ops.reduce_all(elements_finished)
-
-        next_input = control_flow_ops.cond(
-            finished,
-            lambda: array_ops.zeros_like(initial_input),
-            lambda: initial_input if cell_output is None else cell.output_function(next_cell_state)
+            cell.termination_condition(next_cell_state, next_input)
         )
         emit_output = next_input[0] if cell_output is None else next_input
 
         next_loop_state = None
         return (elements_finished, next_input, next_cell_state, emit_output, next_loop_state)
 
-    states, outputs, final_state = raw_rnn(cell, loop_fn, scope=scope)
+    states, outputs, final_state = raw_rnn(cell, loop_fn, emit_states=emit_states, scope=scope)
     return states, outputs, final_state
+
+
+def _compact_free_run(cell, initial_state, sequence_length, initial_input, parallel_iterations=32,
+                      emit_states=True, scope=None):
+    """
+    Free running loop with the same outputs as rnn_free_run, except that the working batch only holds
+    the sequences which are still being sampled.  Finished rows are dropped from the loop variables as
+    soon as they terminate, so they no longer run the cell or output function, and every timestep's
+    outputs and states are scattered back to full batch positions before being recorded.  When no
+    states are recorded, only the states of rows which finish at a timestep are scattered back.
+
+    returns (
+        states for all timesteps,
+        outputs for all timesteps,
+        final cell state,
+    )
+    """
+    with vs.variable_scope(scope or "rnn", reuse=vs.AUTO_REUSE):
+        full_shape = array_ops.shape(initial_input)
+        batch_size = full_shape[0]
+        sequence_length = array_ops.broadcast_to(sequence_length, [batch_size])
+
+        time = constant_op.constant(0, dtype=dtypes.int32)
+        initial_state = nest.map_structure(ops.convert_to_tensor, initial_state)
+        elements_finished = math_ops.logical_or(
+            time >= sequence_length,
+            cell.termination_condition(initial_state, initial_input)
+        )
+        active = math_ops.cast(array_ops.where_v2(math_ops.logical_not(elements_finished))[:, 0], dtypes.int32)
+        active_input = array_ops.gather(initial_input, active)
+        active_state = nest.map_structure(lambda s: array_ops.gather(s, active), initial_state)
+
+        emit_ta = tensor_array_ops.TensorArray(
+            dtype=initial_input.dtype,
+            dynamic_size=True,
+            element_shape=initial_input.shape,
+            size=0,
+            name="rnn_output"
+        )
+        state_ta = nest.map_structure(
+            lambda s: tensor_array_ops.TensorArray(
+                dtype=s.dtype,
+                dynamic_size=True,
+                element_shape=s.shape,
+                size=0,
+                name="rnn_state"
+            ),
+            _select_states(initial_state, emit_states)
+        )
+
+        def condition(unused_time, active, *_):
+            return math_ops.greater(array_ops.size(active), 0)
+
+        def body(time, active, active_input, active_state, state, emit_ta, state_ta):
+            active_cell = cell.gather(active)
+            _, next_active_state = active_cell(active_input, active_state)
+            scatter_idx = array_ops.expand_dims(active, 1)
+
+            next_time = time + 1
+            next_active_input = active_cell.output_function(next_active_state)
+            next_finished = math_ops.logical_or(
+                next_time >= array_ops.gather(sequence_length, active),
+                active_cell.termination_condition(next_active_state, next_active_input)
+            )
+
+            emit_output = array_ops.scatter_nd(scatter_idx, next_active_input, full_shape)
+            emit_ta = emit_ta.write(time, emit_output)
+
+            if emit_states:
+                next_state = nest.map_structure(
+                    lambda s, a: array_ops.tensor_scatter_nd_update(s, scatter_idx, a),
+                    state, next_active_state
+                )
+                state_ta = nest.map_structure(
+                    lambda ta, s: ta.write(time, s), state_ta, _select_states(next_state, emit_states))
+            else:
+                finished_idx = array_ops.boolean_mask(scatter_idx, next_finished)
+                next_state = nest.map_structure(
+                    lambda s, a: array_ops.tensor_scatter_nd_update(
+                        s, finished_idx, array_ops.boolean_mask(a, next_finished)),
+                    state, next_active_state
+                )
+
+            keep = math_ops.logical_not(next_finished)
+            next_active = array_ops.boolean_mask(active, keep)
+            next_active_input = array_ops.boolean_mask(next_active_input, keep)
+            next_active_state = nest.map_structure(lambda s: array_ops.boolean_mask(s, keep), next_active_state)
+            return (next_time, next_active, next_active_input, next_active_state,
+                    next_state, emit_ta, state_ta)
+
+        def compact_shape(s):
+            return tensor_shape.TensorShape([None]).concatenate(s.shape[1:])
+
+        loop_vars = [time, active, active_input, active_state, initial_state, emit_ta, state_ta]
+        shape_invariants = [
+            time.shape,
+            tensor_shape.TensorShape([None]),
+            compact_shape(active_input),
+            nest.map_structure(compact_shape, active_state),
+            nest.map_structure(lambda s: s.shape, initial_state),
+            tensor_shape.TensorShape(None),
+            nest.map_structure(lambda _: tensor_shape.TensorShape(None), state_ta),
+        ]
+        returned = control_flow_ops.while_loop(
+            condition, body,
+            loop_vars=loop_vars,
+            shape_invariants=shape_invariants,
+            parallel_iterations=parallel_iterations
+        )
+        (final_state, emit_ta, state_ta) = returned[-3:]
+
+        flat_states = [
+            array_ops.transpose(_stack(ta, array_ops.shape(s)), (1, 0, 2))
+            for ta, s in zip(nest.flatten(state_ta), nest.flatten(_select_states(initial_state, emit_states)))
+        ]
+        states = nest.pack_sequence_as(structure=state_ta, flat_sequence=flat_states) if emit_states else None
+        outputs = array_ops.transpose(_stack(emit_ta, full_shape), (1, 0, 2))
+        return (states, outputs, final_state)
+
+
+def _stack(ta, element_shape):
+    """
+    ta.stack(), which also works if nothing was written to ta (when every sequence is finished at the
+    first timestep), in which case a [0] + element_shape tensor of zeros is returned.
+    """
+    return control_flow_ops.cond(
+        ta.size() > 0,
+        ta.stack,
+        lambda: array_ops.zeros(array_ops.concat([[0], element_shape], axis=0), dtype=ta.dtype)
+    )
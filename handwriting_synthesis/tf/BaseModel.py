@@ -10,9 +10,11 @@ from datetime import datetime
 import numpy as np
 import tensorflow as tf
 import tensorflow.compat.v1 as tfcompat
+from tensorflow.core.protobuf import config_pb2, meta_graph_pb2, rewriter_config_pb2
+from tensorflow.python.grappler import tf_optimizer
 
 from handwriting_synthesis.config import checkpoint_path, prediction_path
-from handwriting_synthesis.tf.utils import shape
+from handwriting_synthesis.tf.utils import session_config, shape
 
 tfcompat.disable_v2_behavior()
 
@@ -23,7 +25,8 @@ class BaseModel(object):
     Subclassing models must implement self.calculate_loss(), which returns a tensor for the batch loss.
     Code for the training loop, parameter updates, checkpointing, and inference are implemented here and
     subclasses are mainly responsible for building the computational graph beginning with the placeholders
-    and ending with the loss tensor.
+    and ending with the loss tensor.  Models which support inference_only must also implement
+    self.calculate_outputs(), which builds only the tensors needed at inference time.
 
     Args:
         reader: Class with attributes train_batch_generator, val_batch_generator, and test_batch_generator
@@ -52,6 +55,11 @@ class BaseModel(object):
         log_dir: Directory where logs are written.
         checkpoint_dir: Directory where checkpoints are saved.
         prediction_dir: Directory where predictions/outputs are saved.
+        inference_only:  If true, only the inference subgraph is built (no loss, optimizer, gradient or
+            parameter averaging ops) and only the variables it uses are restored from checkpoints.  Such a model cannot be trained.
+        xla:  If true, the session compiles the graph with XLA auto-clustering (see tf.utils.session_config).
+        session_options:  Keyword arguments of tf.utils.session_config other than xla (thread pool sizes and
+            graph optimizations) used to configure the session.
     """
 
     def __init__(
@@ -75,7 +83,10 @@ class BaseModel(object):
             validation_batch_size=64,
             log_dir='logs',
             checkpoint_dir=checkpoint_path,
-            prediction_dir=prediction_path
+            prediction_dir=prediction_path,
+            inference_only=False,
+            xla=False,
+            session_options=None
     ):
 
         if batch_sizes is None:
@@ -124,6 +135,9 @@ class BaseModel(object):
         self.log_interval = log_interval
         self.loss_averaging_window = loss_averaging_window
         self.validation_batch_size = validation_batch_size
+        self.inference_only = inference_only
+        self.xla = xla
+        self.session_options = session_options or {}
 
         self.log_dir = log_dir
         self.logging_level = logging_level
@@ -136,7 +150,8 @@ class BaseModel(object):
         logging.info('\nNew run with parameters:\n{}'.format(pp.pformat(self.__dict__)))
 
         self.graph = self.build_graph()
-        self.session = tfcompat.Session(graph=self.graph)
+        self.session = tfcompat.Session(
+            graph=self.graph, config=session_config(xla=self.xla, **self.session_options))
         logging.info('Built Graph')
 
     def update_train_params(self):
@@ -148,7 +163,11 @@ class BaseModel(object):
     def calculate_loss(self):
         raise NotImplementedError('Subclass must implement this.')
 
+    def calculate_outputs(self):
+        raise NotImplementedError('Subclass must implement this.')
+
     def fit(self):
+        assert not self.inference_only, 'Model was built with inference_only=True and cannot be trained'
         with self.session.as_default():
 
             if self.warm_start_init_step:
@@ -374,6 +393,35 @@ class BaseModel(object):
             logging.info('restoring model from {}'.format(model_path))
             saver.restore(self.session, model_path)
 
+    def freeze(self, filename, output_tensors):
+        """
+        Writes a self-contained GraphDef to filename.  The graph is pruned to what is needed to compute
+        output_tensors, variables are inlined as constants using their current values in self.session,
+        and constant subexpressions are folded with grappler.
+        """
+        output_names = [tensor.op.name for tensor in output_tensors]
+        graph_def = tfcompat.graph_util.convert_variables_to_constants(
+            self.session, self.graph.as_graph_def(), output_names)
+
+        with tf.Graph().as_default() as frozen_graph:
+            tfcompat.import_graph_def(graph_def, name='')
+            meta_graph = tfcompat.train.export_meta_graph(graph_def=graph_def, graph=frozen_graph)
+        fetch_collection = meta_graph_pb2.CollectionDef()
+        fetch_collection.node_list.value.extend(output_names)
+        meta_graph.collection_def['train_op'].CopyFrom(fetch_collection)
+
+        config = config_pb2.ConfigProto()
+        config.graph_options.rewrite_options.optimizers.extend(['constfold'])
+        config.graph_options.rewrite_options.meta_optimizer_iterations = rewriter_config_pb2.RewriterConfig.ONE
+        graph_def = tf_optimizer.OptimizeGraph(config, meta_graph)
+
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        logging.info('saving frozen graph with {} nodes to {}'.format(len(graph_def.node), filename))
+        with open(filename, 'wb') as f:
+            f.write(graph_def.SerializeToString())
+
     def init_logging(self, log_dir):
         if not os.path.isdir(log_dir):
             os.makedirs(log_dir)
@@ -432,16 +480,19 @@ class BaseModel(object):
 
     def build_graph(self):
         with tf.Graph().as_default() as graph:
-            self.ema = tf.train.ExponentialMovingAverage(decay=0.99)
-            self.global_step = tf.Variable(0, trainable=False)
-            self.learning_rate_var = tf.Variable(0.0, trainable=False)
-            self.beta1_decay_var = tf.Variable(0.0, trainable=False)
+            if self.inference_only:
+                self.calculate_outputs()
+            else:
+                self.ema = tf.train.ExponentialMovingAverage(decay=0.99)
+                self.global_step = tf.Variable(0, trainable=False)
+                self.learning_rate_var = tf.Variable(0.0, trainable=False)
+                self.beta1_decay_var = tf.Variable(0.0, trainable=False)
 
-            self.loss = self.calculate_loss()
-            self.update_parameters(self.loss)
+                self.loss = self.calculate_loss()
+                self.update_parameters(self.loss)
 
             self.saver = tfcompat.train.Saver(max_to_keep=1)
-            if self.enable_parameter_averaging:
+            if self.enable_parameter_averaging and self.ema is not None:
                 self.saver_averaged = tfcompat.train.Saver(self.ema.variables_to_restore(), max_to_keep=1)
 
             self.init = tfcompat.global_variables_initializer()
@@ -1,3 +1,5 @@
+import os
+
 import tensorflow as tf
 import tensorflow.compat.v1 as tfcompat
 
@@ -91,3 +93,42 @@ def shape(tensor, dim=None):
 def rank(tensor):
     """Get tensor rank as python list"""
     return len(tensor.shape.as_list())
+
+
+def session_config(xla=False, intra_op_threads=None, inter_op_threads=None, use_per_session_threads=False,
+                   opt_level=None, grappler=True):
+    """
+    Returns the tf.ConfigProto used for sessions.
+
+    Args:
+        xla: If true, the graph is compiled with XLA auto-clustering, which fuses clusters of ops (e.g. the
+            body of a while loop) into JIT compiled kernels.  XLA only auto-clusters CPU ops if TF_XLA_FLAGS
+            contains --tf_xla_cpu_global_jit when the flags are first read, so it is added to the environment
+            here.  This has no effect if a session has already run in the process.
+        intra_op_threads: Number of threads a single op (e.g. a matmul) is split across.  None leaves it to
+            tensorflow, which uses one thread per core.
+        inter_op_threads: Number of threads independent ops are run on concurrently.  None leaves it to
+            tensorflow, which uses one thread per core.
+        use_per_session_threads: If true, the session gets thread pools of its own.  Otherwise all
+            sessions of the process share the pools created (and sized) by the first one.
+        opt_level: 'L0' or 'L1' (the default, which adds constant folding and common subexpression
+            elimination) level of the graph optimizations applied when a graph is first run.
+        grappler: If false, grappler's graph rewrites (layout, arithmetic, loop and remapping
+            optimizers) are switched off.
+    """
+    config = tfcompat.ConfigProto()
+    if intra_op_threads is not None:
+        config.intra_op_parallelism_threads = intra_op_threads
+    if inter_op_threads is not None:
+        config.inter_op_parallelism_threads = inter_op_threads
+    config.use_per_session_threads = use_per_session_threads
+    if opt_level is not None:
+        config.graph_options.optimizer_options.opt_level = getattr(tfcompat.OptimizerOptions, opt_level)
+    if not grappler:
+        config.graph_options.rewrite_options.disable_meta_optimizer = True
+    if xla:
+        xla_flags = os.environ.get('TF_XLA_FLAGS', '')
+        if '--tf_xla_cpu_global_jit' not in xla_flags:
+            os.environ['TF_XLA_FLAGS'] = (xla_flags + ' --tf_xla_cpu_global_jit').strip()
+        config.graph_options.optimizer_options.global_jit_level = tfcompat.OptimizerOptions.ON_1
+    return config